@@ -1,10 +1,52 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, g, has_request_context, render_template, jsonify, request, session
+from flask.json.provider import DefaultJSONProvider
 import requests
 import json
-from datetime import datetime, timedelta
+import gzip
+import csv
+import io
+import hashlib
+import mmap
+import struct
+import zlib
+import numpy as np
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 import time
+import random
+import threading
+import functools
+from bisect import bisect_left, bisect_right
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Integer, MetaData, Table, Text,
+                        create_engine, select)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+# Thư viện tùy chọn: orjson để encode JSON nhanh hơn, brotli để nén response (ngoài gzip),
+# pyarrow để export Parquet/Arrow
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-in-production'
@@ -21,31 +63,845 @@ class ManagerNotFound(FPLAPIError):
     """Lỗi khi không tìm thấy manager ID."""
     pass
 
+class UpstreamUnavailable(FPLAPIError):
+    """FPL API đang bị circuit breaker chặn hoặc vượt giới hạn tốc độ, không gửi request."""
+    pass
+
+# Địa chỉ FPL API (đổi sang server giả lập khi chạy benchmark, xem fake_fpl_server.py)
+FPL_API_BASE_URL = os.environ.get('FPL_API_BASE_URL', 'https://fantasy.premierleague.com/api/').rstrip('/') + '/'
+
+# TTL (giây) cho từng loại endpoint của FPL API
+CACHE_TTLS = {
+    'bootstrap': 300,
+    'live': 30,
+    'entry': 600,
+    'history': 300,
+    'picks': 60,
+    'league': 300,
+}
+
+# Giới hạn bộ nhớ tối đa của response cache (tính theo số byte body upstream)
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Số request upstream chạy song song tối đa (cũng là kích thước connection pool)
+FETCH_MAX_WORKERS = 16
+
+# Thời gian tối đa (giây) một route được phép chờ các request upstream song song
+REQUEST_DEADLINE = 20
+
+# Giới hạn tốc độ gọi FPL API theo loại endpoint: (số request/giây, burst)
+RATE_LIMITS = {
+    'bootstrap': (2, 5),
+    'live': (2, 5),
+    'entry': (20, 40),
+    'history': (20, 40),
+    'picks': (20, 40),
+    'league': (10, 20),
+}
+
+# Retry khi upstream trả 429/5xx hoặc lỗi kết nối: số lần thử lại và backoff (giây)
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8
+
+# Tổng thời gian tối đa (giây) cho một lần gọi upstream, tính cả chờ rate limit và retry
+UPSTREAM_CALL_BUDGET = 15
+
+# Timeout (kết nối, đọc) của mỗi request upstream
+UPSTREAM_TIMEOUT = (3.05, 10)
+
+# Circuit breaker: mở sau số lỗi liên tiếp này, thử lại (half-open) sau reset timeout
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# Số trang bảng xếp hạng league được tải song song khi duyệt toàn bộ league
+LEAGUE_CRAWL_CONCURRENCY = 4
+
+# History được cập nhật trong khoảng này (giây) được coi là còn mới khi gameweek đang diễn ra
+# (hoặc khi không lấy được lịch gameweek); ngoài thời gian đó xem FreshnessPolicy
+HISTORY_MAX_AGE = CACHE_TTLS['history']
+
+# Số manager tối đa trong một request batch
+MAX_BATCH_MANAGERS = 200
+
+# Export: số managers được tải và ghi ra mỗi lần (một chunk CSV / một row group Parquet), số lần
+# thử lại managers bị timeout hoặc rate limit, và dòng cuối được ghi thêm khi export không đầy đủ
+EXPORT_BATCH_SIZE = 500
+EXPORT_RETRIES = 3
+EXPORT_ERROR_TRAILER = '\n#error: {}\n'
+
+# Export chạy trên thread pool và rate limit riêng (số request/giây, burst), để một export lớn không
+# chiếm thread của fetch_executor và token của các route tương tác
+EXPORT_MAX_WORKERS = 4
+EXPORT_RATE_LIMITS = {
+    'entry': (8, 16),
+    'history': (8, 16),
+    'picks': (8, 16),
+    'league': (4, 8),
+}
+
+# Các dataset export được: danh sách (tên cột, kiểu pyarrow)
+EXPORT_DATASETS = {
+    'history': [('manager_id', 'int64')] + [(name, 'int64') for name in (
+        'event', 'points', 'total_points', 'rank', 'rank_sort', 'overall_rank', 'percentile_rank',
+        'bank', 'value', 'event_transfers', 'event_transfers_cost', 'points_on_bench')],
+    'picks': [('manager_id', 'int64'), ('gameweek', 'int64'), ('element', 'int64'), ('position', 'int64'),
+              ('multiplier', 'int64'), ('is_captain', 'bool_'), ('is_vice_captain', 'bool_')],
+    'standings': [('league_id', 'int64'), ('entry', 'int64'), ('entry_name', 'string'), ('player_name', 'string'),
+                  ('rank', 'int64'), ('last_rank', 'int64'), ('total', 'int64'), ('event_total', 'int64')],
+}
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# Chu kỳ (giây) poll dữ liệu live khi gameweek đang diễn ra và khi giữa các gameweek
+LIVE_POLL_INTERVAL = 30
+IDLE_POLL_INTERVAL = 300
+LIVE_POLLER_ENABLED = os.environ.get('LIVE_POLLER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Live poller chỉ tải picks của managers đang được xem (session, stream SSE, compare) trong
+# LIVE_WATCH_TTL giây gần nhất, tối đa LIVE_WATCH_MAX_MANAGERS managers (bỏ người xem cũ nhất)
+LIVE_WATCH_TTL = 1800
+LIVE_WATCH_MAX_MANAGERS = int(os.environ.get('LIVE_WATCH_MAX_MANAGERS', 2000))
+
+# Server-Sent Events: chu kỳ heartbeat và thời gian tối đa của một kết nối (client tự kết nối lại)
+LIVE_STREAM_HEARTBEAT = 15
+LIVE_STREAM_MAX_SECONDS = 600
+# Mỗi stream SSE giữ một thread của worker (gthread) trong suốt kết nối: giới hạn số stream mỗi
+# worker để luôn còn thread cho các request khác (mặc định một nửa --threads 32 trong render.yaml);
+# stream vượt giới hạn nhận 503 và dashboard chuyển sang poll /api/live-scores
+LIVE_STREAM_MAX_CONNECTIONS = int(os.environ.get('LIVE_STREAM_MAX_CONNECTIONS', 16))
+
+# Bucket của các histogram trên /metrics: độ trễ (giây) và số managers trong một lần fan-out
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 200, 500, 1000, 2500, 5000, 10000)
+
+# Nén response: chỉ nén body từ COMPRESS_MIN_SIZE byte, mức nén gzip/brotli cho dữ liệu động
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Cache bytes đã nén theo ETag của body, để payload không đổi chỉ phải nén một lần
+ENCODED_CACHE_MAX_BYTES = 16 * 1024 * 1024
+ENCODED_CACHE_TTL = 600
+
+# Số managers tối đa giữ trong bộ nhớ của một worker (LRU); manager bị loại được nạp lại từ store
+TRACKER_MAX_MANAGERS = int(os.environ.get('TRACKER_MAX_MANAGERS', 100000))
+
+# Số gameweek gần nhất dùng để tính phong độ (form) của manager
+FORM_GAMEWEEKS = int(os.environ.get('FORM_GAMEWEEKS', 5))
+
+# Database lưu dữ liệu managers dùng chung giữa các worker (mặc định giống settings.py)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(BASE_DIR, 'db.sqlite3')}"
+
+# Lưu trữ điểm live đã poll (một file mỗi gameweek) để xem lại theo thời gian và replay offline
+LIVE_ARCHIVE_ENABLED = os.environ.get('LIVE_ARCHIVE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LIVE_ARCHIVE_DIR = os.environ.get('LIVE_ARCHIVE_DIR') or os.path.join(BASE_DIR, 'live_archive')
+
+# Replay: LivePoller đọc điểm live của gameweek này từ archive thay vì FPL API, nhanh gấp
+# LIVE_REPLAY_SPEED lần thời gian thực
+LIVE_REPLAY_GAMEWEEK = int(os.environ['LIVE_REPLAY_GAMEWEEK']) if os.environ.get('LIVE_REPLAY_GAMEWEEK') else None
+LIVE_REPLAY_SPEED = float(os.environ.get('LIVE_REPLAY_SPEED', 60))
+
+
+class Histogram:
+    """Số lần quan sát theo từng bucket (chưa cộng dồn) và tổng giá trị."""
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class MetricsRegistry:
+    """Counter, histogram và gauge trong bộ nhớ của worker, xuất ra định dạng text của Prometheus.
+
+    Mỗi lần ghi chỉ tốn một lock và một bisect nên có thể bật thường trực trên production.
+    Labels là tuple các cặp (tên, giá trị); giá trị phải thuộc một tập hữu hạn (route, endpoint,
+    status...) để số time series không tăng vô hạn.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (kind, help, buckets)
+        self._values = {}  # name -> {labels: số đếm | Histogram}
+        self._collectors = {}  # name -> hàm trả về {labels: giá trị} cho gauge
+
+    def counter(self, name: str, help_text: str):
+        self._meta[name] = ('counter', help_text, None)
+        self._values[name] = {}
+
+    def histogram(self, name: str, help_text: str, buckets):
+        self._meta[name] = ('histogram', help_text, tuple(buckets))
+        self._values[name] = {}
+
+    def gauge(self, name: str, help_text: str, collect):
+        """Gauge được tính tại thời điểm xuất metrics bằng collect()."""
+        self._meta[name] = ('gauge', help_text, None)
+        self._collectors[name] = collect
+
+    def inc(self, name: str, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            values = self._values[name]
+            values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        buckets = self._meta[name][2]
+        index = bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._values[name].get(labels)
+            if histogram is None:
+                histogram = self._values[name][labels] = Histogram(len(buckets) + 1)
+            histogram.counts[index] += 1
+            histogram.sum += value
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ''
+        escaped = (
+            (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels
+        )
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+    def render(self) -> str:
+        """Xuất toàn bộ metrics theo Prometheus text exposition format 0.0.4."""
+        with self._lock:
+            values = {
+                name: [
+                    (labels, (list(value.counts), value.sum) if isinstance(value, Histogram) else value)
+                    for labels, value in series.items()
+                ]
+                for name, series in self._values.items()
+            }
+
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'gauge':
+                try:
+                    series = list(self._collectors[name]().items())
+                except Exception as e:
+                    logger.error(f"Không thể tính gauge {name}: {e}")
+                    continue
+            else:
+                series = values[name]
+
+            for labels, value in series:
+                if kind != 'histogram':
+                    lines.append(f'{name}{self._format_labels(labels)} {value}')
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip((*(format(b, 'g') for b in buckets), '+Inf'), counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f'{name}_sum{self._format_labels(labels)} {total}')
+                lines.append(f'{name}_count{self._format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.histogram('fpl_http_request_duration_seconds', 'Thời gian xử lý request theo route.', LATENCY_BUCKETS)
+metrics.histogram('fpl_api_call_duration_seconds', 'Thời gian của mỗi method FantasyAPI, tính cả cache.', LATENCY_BUCKETS)
+metrics.counter('fpl_api_call_errors_total', 'Số lần method FantasyAPI ném exception.')
+metrics.histogram('fpl_upstream_request_duration_seconds', 'Thời gian một request HTTP tới FPL API.', LATENCY_BUCKETS)
+metrics.counter('fpl_upstream_responses_total', 'Số response từ FPL API theo status code (error: lỗi kết nối).')
+metrics.counter('fpl_upstream_response_bytes_total', 'Số byte body nhận từ FPL API.')
+metrics.counter('fpl_cache_requests_total', 'Số lần tra response cache: hit, miss, revalidated (upstream trả 304).')
+metrics.histogram('fpl_fanout_managers', 'Số managers được tải song song trong một lần fan-out.', FANOUT_BUCKETS)
+metrics.counter('fpl_compressed_responses_total', 'Số response được nén, theo encoding và việc dùng lại bytes đã cache.')
+metrics.counter('fpl_response_bytes_saved_total', 'Số byte tiết kiệm được nhờ nén response.')
+
+
+def instrumented(func):
+    """Decorator ghi thời gian và số lỗi của một method FantasyAPI."""
+    labels = (('method', func.__qualname__),)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.inc('fpl_api_call_errors_total', labels)
+            raise
+        finally:
+            metrics.observe('fpl_api_call_duration_seconds', time.perf_counter() - started, labels)
+    return wrapper
+
+
+def current_route() -> str:
+    """Route (dạng rule, ví dụ /api/manager/<int:manager_id>/stats) của request hiện tại."""
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def record_fanout(size: int):
+    metrics.observe('fpl_fanout_managers', size, (('route', current_route()),))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider của Flask dùng orjson (nếu được cài) cho jsonify và app.json.dumps.
+
+    Kiểu dữ liệu orjson không tự xử lý (datetime, Decimal...) được chuyển đổi giống provider
+    mặc định của Flask. Key của dict giữ nguyên thứ tự chèn thay vì được sắp xếp.
+    """
+
+    def _orjson_option(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_option()).decode()
+
+    def response(self, *args, **kwargs) -> Response:
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_option(indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+app.json = FastJSONProvider(app)
+
+
+class TTLCache:
+    """Cache LRU giới hạn theo dung lượng, mỗi entry có thời hạn (TTL) riêng.
+
+    Entry hết hạn nhưng có validators (ETag/Last-Modified) vẫn được giữ lại tới khi
+    bị LRU loại bỏ, để có thể revalidate với upstream thay vì tải lại toàn bộ.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self._data = OrderedDict()  # key -> (expires_at, size, value, validators)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Trả về value còn hạn hoặc None. Entry được đánh dấu là mới dùng gần nhất."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value, validators = entry
+            if expires_at <= time.monotonic():
+                if not validators:
+                    del self._data[key]
+                    self.current_bytes -= size
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key: str) -> Optional[tuple]:
+        """Trả về (value, validators) kể cả khi entry đã hết hạn, hoặc None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            return entry[2], entry[3]
+
+    def set(self, key: str, value: Any, ttl: float, size: int, validators: Optional[Dict] = None):
+        """Lưu value với TTL, loại bỏ các entry ít dùng nhất khi vượt giới hạn bộ nhớ."""
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._data[key] = (time.monotonic() + ttl, size, value, validators or {})
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._data:
+                _, (_, evicted_size, _, _) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def touch(self, key: str, ttl: float):
+        """Gia hạn entry sau khi upstream xác nhận dữ liệu chưa đổi (HTTP 304)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            self._data[key] = (time.monotonic() + ttl,) + entry[1:]
+            self._data.move_to_end(key)
+            self.revalidations += 1
+
+    def invalidate(self, key: Optional[str] = None):
+        """Xóa một entry, hoặc toàn bộ cache nếu không truyền key."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+                self.current_bytes = 0
+            else:
+                old = self._data.pop(key, None)
+                if old is not None:
+                    self.current_bytes -= old[1]
+
+    def stats(self) -> Dict:
+        """Số liệu hit/miss và dung lượng hiện tại của cache."""
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'revalidations': self.revalidations,
+            }
+
+
+class TokenBucket:
+    """Token bucket thread-safe: rate token/giây, tối đa burst token."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Giữ chỗ một token, trả về số giây cần chờ trước khi dùng, hoặc None nếu phải chờ quá max_wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    """Circuit breaker cho upstream: closed -> open sau nhiều lỗi liên tiếp -> half-open thử một request."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self._probing else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Request thử bị hủy giữa chừng (không rõ upstream còn lỗi không): cho phép thử lại ngay."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    logger.warning(f"Circuit breaker opened after {self.failures} upstream failures")
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class UpstreamGateway:
+    """Điểm đi ra chung tới FPL API: rate limit theo endpoint, retry có backoff, circuit breaker.
+
+    Mỗi lần gọi bị giới hạn trong UPSTREAM_CALL_BUDGET giây nên độ trễ tệ nhất của route
+    không tăng tuyến tính theo số manager khi FPL chậm hoặc rate-limit.
+    """
+
+    def __init__(self, rate_limits: Dict = RATE_LIMITS, breaker: Optional[CircuitBreaker] = None):
+        self.buckets = {endpoint: TokenBucket(rate, burst) for endpoint, (rate, burst) in rate_limits.items()}
+        # Các gateway tới cùng FPL API có thể dùng chung một circuit breaker
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+
+    def _acquire(self, endpoint: str, deadline: float) -> float:
+        """Lấy token rồi kiểm tra circuit breaker, trả về số giây cần chờ.
+
+        Breaker chỉ được hỏi sau khi đã có token, để request thử (half-open) không bị rate limit
+        chặn lại sau khi đã được cấp; get() luôn ghi nhận kết quả của request thử (kể cả khi có exception).
+        """
+        bucket = self.buckets.get(endpoint)
+        wait = 0.0
+        if bucket is not None:
+            wait = bucket.reserve(max(0.0, deadline - time.monotonic()))
+            if wait is None:
+                raise UpstreamUnavailable(f"Rate limit for '{endpoint}' exceeded")
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("FPL API circuit breaker is open")
+        return wait
+
+    def _abort_attempt(self, endpoint: str, started: Optional[float], error: BaseException):
+        """Kết thúc một lần gọi bị exception ngoài các lỗi được retry, để breaker không kẹt ở half-open.
+
+        Lỗi thường tính là một lần thất bại; hủy (KeyboardInterrupt, SystemExit...) chỉ trả lại
+        lượt thử vì không cho biết gì về trạng thái upstream.
+        """
+        if isinstance(error, Exception):
+            if started is not None:
+                self._record(endpoint, 'error', started)
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str], deadline: float) -> Optional[float]:
+        """Ghi nhận lỗi, trả về thời gian chờ trước lần thử tiếp theo hoặc None nếu không thử lại."""
+        self.breaker.record_failure()
+        if attempt >= RETRY_ATTEMPTS or self.breaker.state == 'open':
+            return None
+        delay = None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+        if delay is None:
+            # Exponential backoff với full jitter
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        delay = max(0.0, delay)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self.retries += 1
+        return delay
+
+    @staticmethod
+    def _is_retryable(status: int) -> bool:
+        return status == 429 or status >= 500
+
+    @staticmethod
+    def _record(endpoint: str, status, started: float, size: int = 0):
+        metrics.observe('fpl_upstream_request_duration_seconds', time.perf_counter() - started,
+                        (('endpoint', endpoint),))
+        metrics.inc('fpl_upstream_responses_total', (('endpoint', endpoint), ('status', str(status))))
+        if size:
+            metrics.inc('fpl_upstream_response_bytes_total', (('endpoint', endpoint),), size)
+
+    def get(self, session: requests.Session, url: str, endpoint: str, headers: Optional[Dict] = None):
+        """GET qua gateway, trả về requests.Response (response lỗi cuối cùng nếu hết lượt retry)."""
+        deadline = time.monotonic() + UPSTREAM_CALL_BUDGET
+        attempt = 0
+        while True:
+            wait = self._acquire(endpoint, deadline)
+            started = None
+            try:
+                time.sleep(wait)
+                started = time.perf_counter()
+                response = session.get(url, timeout=UPSTREAM_TIMEOUT, headers=headers)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                self._record(endpoint, 'error', started)
+                delay = self._retry_delay(attempt, None, deadline)
+                if delay is None:
+                    raise
+            except BaseException as e:
+                self._abort_attempt(endpoint, started, e)
+                raise
+            else:
+                self._record(endpoint, response.status_code, started, len(response.content))
+                if not self._is_retryable(response.status_code):
+                    self.breaker.record_success()
+                    return response
+                delay = self._retry_delay(attempt, response.headers.get('Retry-After'), deadline)
+                if delay is None:
+                    return response
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self) -> Dict:
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'retries': self.retries,
+        }
+
+
+class SingleFlight:
+    """Gộp các lời gọi đồng thời có cùng key: chỉ một thread thực thi, các thread khác chờ
+    và dùng chung kết quả (hoặc exception)."""
 
-class FantasyAPI:
     def __init__(self):
-        self.base_url = "https://fantasy.premierleague.com/api/"
+        self.coalesced = 0
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = Future()
+                leader = True
+        if not leader:
+            return call.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def parse_deadline(deadline: Optional[str]) -> Optional[datetime]:
+    """Chuyển deadline_time của FPL (ISO 8601, hậu tố Z) thành datetime có timezone."""
+    if not deadline:
+        return None
+    return datetime.fromisoformat(deadline.replace('Z', '+00:00'))
+
+
+class Bootstrap:
+    """bootstrap-static đã được parse và đánh chỉ mục theo id.
+
+    Mỗi phiên bản dữ liệu upstream chỉ được dựng một lần (xem FantasyAPI.get_bootstrap) và
+    dùng chung giữa các request; tra cứu gameweek, cầu thủ, đội đều là O(1).
+    """
+    __slots__ = ('raw', 'events', 'elements', 'teams', 'element_types', 'deadlines',
+                 'current', 'next', 'last_finished', '_sorted_deadlines')
+
+    def __init__(self, data: Dict):
+        self.raw = data
+        self.events = {event['id']: event for event in data.get('events', [])}
+        self.elements = {element['id']: element for element in data.get('elements', [])}
+        self.teams = {team['id']: team for team in data.get('teams', [])}
+        self.element_types = {element_type['id']: element_type for element_type in data.get('element_types', [])}
+        self.deadlines = {event_id: parse_deadline(event.get('deadline_time')) for event_id, event in self.events.items()}
+
+        self.current = next((event for event in self.events.values() if event.get('is_current')), None)
+        self.next = next((event for event in self.events.values() if event.get('is_next')), None)
+        finished = [event for event in self.events.values() if event.get('finished')]
+        self.last_finished = max(finished, key=lambda event: event['id']) if finished else None
+        self._sorted_deadlines = sorted(deadline for deadline in self.deadlines.values() if deadline)
+
+    @property
+    def scores_gameweek(self) -> Optional[Dict]:
+        """Gameweek dùng để tính điểm: vòng hiện tại, hoặc vòng gần nhất đã kết thúc."""
+        return self.current or self.last_finished
+
+    def gameweek(self, gameweek_id: int) -> Optional[Dict]:
+        return self.events.get(gameweek_id)
+
+    def element(self, element_id: int) -> Optional[Dict]:
+        return self.elements.get(element_id)
+
+    def team(self, team_id: int) -> Optional[Dict]:
+        return self.teams.get(team_id)
+
+    def element_type(self, element_type_id: int) -> Optional[Dict]:
+        return self.element_types.get(element_type_id)
+
+    def deadline(self, gameweek_id: int) -> Optional[datetime]:
+        return self.deadlines.get(gameweek_id)
+
+    def deadline_passed(self, gameweek_id: int, now: Optional[datetime] = None) -> bool:
+        deadline = self.deadlines.get(gameweek_id)
+        return deadline is not None and deadline <= (now or datetime.now(timezone.utc))
+
+    def last_deadline(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Deadline gần nhất đã qua."""
+        index = bisect_left(self._sorted_deadlines, now or datetime.now(timezone.utc))
+        return self._sorted_deadlines[index - 1] if index else None
+
+    @property
+    def state(self) -> tuple:
+        """Trạng thái vòng đời của gameweek hiện tại; thay đổi khi gameweek bắt đầu, kết thúc hoặc được data_checked."""
+        current = self.current or {}
+        return current.get('id'), bool(current.get('finished')), bool(current.get('data_checked'))
+
+    def is_live(self, now: Optional[datetime] = None) -> bool:
+        """Điểm còn có thể thay đổi: gameweek hiện tại chưa data_checked, hoặc deadline của
+        vòng kế tiếp đã qua nhưng bootstrap (đang cache) chưa kịp cập nhật."""
+        now = now or datetime.now(timezone.utc)
+        if self.next and self.deadline_passed(self.next['id'], now):
+            return True
+        return bool(self.current) and not self.current.get('data_checked') and \
+            self.deadline_passed(self.current['id'], now)
+
+
+class FreshnessPolicy:
+    """Quyết định history của manager có cần tải lại hay không theo lịch gameweek.
+
+    - Gameweek đang diễn ra (Bootstrap.is_live): history chỉ còn mới trong HISTORY_MAX_AGE giây.
+    - Ngoài thời gian đó dữ liệu của các gameweek đã kết thúc là bất biến; history chỉ thay
+      đổi tại deadline kế tiếp hoặc khi gameweek vừa kết thúc được data_checked. History lấy
+      sau mốc gần nhất (deadline đã qua, hoặc lúc worker thấy trạng thái gameweek thay đổi)
+      được giữ nguyên, không gọi lại upstream.
+
+    Lúc worker khởi động chưa biết trạng thái trước đó nên mốc ban đầu là thời điểm khởi động.
+    """
+
+    def __init__(self, api: 'FantasyAPI'):
+        self.api = api
+        self._bootstrap: Optional[Bootstrap] = None
+        self._state: Optional[tuple] = None
+        self._changed_at = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+
+    def _observe(self, bootstrap: Bootstrap, now: datetime) -> datetime:
+        """Ghi nhận thời điểm trạng thái gameweek thay đổi, trả về mốc đó."""
+        if bootstrap is not self._bootstrap:
+            with self._lock:
+                if bootstrap is not self._bootstrap:
+                    if self._state is not None and bootstrap.state != self._state:
+                        self._changed_at = now
+                    self._bootstrap = bootstrap
+                    self._state = bootstrap.state
+        return self._changed_at
+
+    def is_fresh(self, last_updated: Optional[datetime]) -> bool:
+        """History cập nhật lúc last_updated (giờ địa phương, như datetime.now()) còn dùng được không."""
+        if not last_updated:
+            return False
+        now = datetime.now(timezone.utc)
+        updated = last_updated.astimezone(timezone.utc)
+        try:
+            bootstrap = self.api.get_bootstrap()
+        except FPLAPIError:
+            return (now - updated).total_seconds() < HISTORY_MAX_AGE
+
+        changed_at = self._observe(bootstrap, now)
+        if bootstrap.is_live(now):
+            return (now - updated).total_seconds() < HISTORY_MAX_AGE
+        last_deadline = bootstrap.last_deadline(now)
+        boundary = max(changed_at, last_deadline) if last_deadline else changed_at
+        return updated >= boundary
+
+
+class FantasyAPI:
+    def __init__(self, gateway: Optional[UpstreamGateway] = None, cacheable: bool = True,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.base_url = FPL_API_BASE_URL
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Cache-Control': 'no-cache',
             'Pragma': 'no-cache'
         })
-    
-    def get_live_event(self, gameweek: int) -> Dict:
-        """Lấy dữ liệu live (điểm cầu thủ) cho toàn bộ gameweek."""
-        url = f"{self.base_url}event/{gameweek}/live/"
-        response = self.session.get(url, timeout=10)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_MAX_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.cache = TTLCache()
+        self.gateway = gateway or UpstreamGateway()
+        # cacheable=False: client không đọc/ghi response cache (dữ liệu chỉ đọc một lần, như export)
+        self.cacheable = cacheable
+        # Thread pool cho các lời gọi song song của client (mặc định fetch_executor)
+        self.executor = executor
+        self.flights = SingleFlight()
+        self._bootstrap: Optional[Bootstrap] = None
+
+    def _get_json(self, url: str, endpoint: str, force_refresh: bool = False, cacheable: bool = True) -> Dict:
+        """GET một URL và parse JSON, dùng cache theo TTL của endpoint.
+
+        force_refresh=True bỏ qua giá trị đang cache và ghi đè bằng dữ liệu mới
+        (vẫn revalidate bằng ETag nếu có, upstream trả 304 thì dùng lại giá trị cũ).
+        cacheable=False không đọc/ghi cache (dùng cho dữ liệu lớn chỉ đọc một lần).
+        Các lời gọi đồng thời tới cùng URL chỉ tạo một request upstream (single-flight).
+        """
+        if not cacheable or not self.cacheable:
+            return self.flights.do(url, lambda: self._fetch_uncached(url, endpoint))
+
+        if not force_refresh:
+            cached = self.cache.get(url)
+            if cached is not None:
+                metrics.inc('fpl_cache_requests_total', (('endpoint', endpoint), ('result', 'hit')))
+                return cached
+        metrics.inc('fpl_cache_requests_total', (('endpoint', endpoint), ('result', 'miss')))
+
+        return self.flights.do(url, lambda: self._fetch(url, endpoint))
+
+    def _fetch_uncached(self, url: str, endpoint: str) -> Dict:
+        response = self.gateway.get(self.session, url, endpoint)
         response.raise_for_status()
         return response.json()
+
+    def _fetch(self, url: str, endpoint: str) -> Dict:
+        """Tải URL từ upstream (revalidate nếu có ETag) và ghi vào cache."""
+        # Gửi ETag/Last-Modified đã lưu để upstream có thể trả 304 (không có body)
+        ttl = CACHE_TTLS.get(endpoint, 0)
+        headers = {}
+        stale = self.cache.get_stale(url)
+        if stale:
+            validators = stale[1]
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last_modified' in validators:
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        response = self.gateway.get(self.session, url, endpoint, headers)
+        if response.status_code == 304 and stale:
+            self.cache.touch(url, ttl)
+            metrics.inc('fpl_cache_requests_total', (('endpoint', endpoint), ('result', 'revalidated')))
+            return stale[0]
+        response.raise_for_status()
+        data = response.json()
+
+        validators = {}
+        if response.headers.get('ETag'):
+            validators['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validators['last_modified'] = response.headers['Last-Modified']
+        self.cache.set(url, data, ttl, len(response.content), validators)
+        return data
+
+    @instrumented
+    def get_live_event(self, gameweek: int, force_refresh: bool = False) -> Dict:
+        """Lấy dữ liệu live (điểm cầu thủ) cho toàn bộ gameweek."""
+        url = f"{self.base_url}event/{gameweek}/live/"
+        return self._get_json(url, 'live', force_refresh)
     
-    def get_manager_info(self, manager_id: int) -> Dict:
+    @instrumented
+    def get_manager_info(self, manager_id: int, force_refresh: bool = False) -> Dict:
         """Lấy thông tin manager. Ném ra ManagerNotFound hoặc FPLAPIError khi có lỗi."""
         try:
             url = f"{self.base_url}entry/{manager_id}/"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, 'entry', force_refresh)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
                 raise ManagerNotFound(f"Manager {manager_id} not found") from e
@@ -55,13 +911,12 @@ class FantasyAPI:
             logger.error(f"Error getting manager info for {manager_id}: {e}")
             raise FPLAPIError(f"Generic error for manager {manager_id}") from e
     
-    def get_manager_history(self, manager_id: int) -> Dict:
+    @instrumented
+    def get_manager_history(self, manager_id: int, force_refresh: bool = False) -> Dict:
         """Lấy lịch sử điểm của manager. Ném ra ManagerNotFound hoặc FPLAPIError khi có lỗi."""
         try:
             url = f"{self.base_url}entry/{manager_id}/history/"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, 'history', force_refresh)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
                 raise ManagerNotFound(f"History for manager {manager_id} not found") from e
@@ -71,97 +926,610 @@ class FantasyAPI:
             logger.error(f"Error getting manager history for {manager_id}: {e}")
             raise FPLAPIError(f"Generic error for manager history {manager_id}") from e
     
-    def get_gameweek_picks(self, manager_id: int, gameweek: int) -> Dict:
+    @instrumented
+    def get_gameweek_picks(self, manager_id: int, gameweek: int, force_refresh: bool = False) -> Dict:
         """Lấy đội hình của manager trong gameweek cụ thể. Ném ra FPLAPIError khi có lỗi."""
         try:
             url = f"{self.base_url}entry/{manager_id}/event/{gameweek}/picks/"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, 'picks', force_refresh)
         except Exception as e:
             logger.error(f"Error getting gameweek picks for manager {manager_id} GW {gameweek}: {e}")
             raise FPLAPIError(f"Could not get picks for manager {manager_id}") from e
     
-    def get_league_standings(self, league_id: int) -> Dict:
-        """Lấy bảng xếp hạng của league. Ném ra FPLAPIError khi có lỗi."""
+    @instrumented
+    def get_league_standings(self, league_id: int, force_refresh: bool = False, page: int = 1,
+                             cacheable: bool = True) -> Dict:
+        """Lấy bảng xếp hạng của league (một trang). Ném ra FPLAPIError khi có lỗi."""
         try:
             url = f"{self.base_url}leagues-classic/{league_id}/standings/"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            if page > 1:
+                url += f"?page_standings={page}"
+            return self._get_json(url, 'league', force_refresh, cacheable)
         except Exception as e:
             logger.error(f"Error getting league standings for {league_id}: {e}")
             raise FPLAPIError(f"Could not get standings for league {league_id}") from e
     
-    def get_bootstrap_static(self) -> Dict:
+    def iter_league_entries(self, league_id: int, concurrency: int = LEAGUE_CRAWL_CONCURRENCY,
+                            first_page: Optional[Dict] = None):
+        """Generator duyệt toàn bộ bảng xếp hạng league theo has_next, yield từng entry.
+
+        first_page là response trang 1 đã có sẵn (không phải tải lại). Chỉ khi trang hiện tại
+        có has_next mới tải trước tối đa concurrency trang song song; các trang được yield theo
+        thứ tự và không được cache, nên bộ nhớ không phụ thuộc số entry của league.
+        """
+        if first_page is None:
+            first_page = self.get_league_standings(league_id, page=1, cacheable=False)
+        standings = first_page['standings']
+        page = 1
+        pending = []  # futures theo thứ tự trang
+        try:
+            while True:
+                yield from standings['results']
+                if not standings['has_next'] or not standings['results']:
+                    return
+                while len(pending) < concurrency:
+                    pending.append((self.executor or fetch_executor).submit(
+                        self.get_league_standings, league_id, page=page + 1 + len(pending), cacheable=False
+                    ))
+                standings = pending.pop(0).result()['standings']
+                page += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @instrumented
+    def get_bootstrap_static(self, force_refresh: bool = False) -> Dict:
         """Lấy dữ liệu cơ bản của game. Ném ra FPLAPIError khi có lỗi."""
         try:
             url = f"{self.base_url}bootstrap-static/"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, 'bootstrap', force_refresh)
         except Exception as e:
             logger.error(f"Error getting bootstrap data: {e}")
             raise FPLAPIError("Could not get bootstrap data") from e
 
+    def get_bootstrap(self, force_refresh: bool = False) -> Bootstrap:
+        """bootstrap-static dạng Bootstrap đã đánh chỉ mục. Ném ra FPLAPIError khi có lỗi.
+
+        Cache trả về cùng một dict cho tới khi upstream có body mới (kể cả khi revalidate
+        nhận 304), nên model chỉ được dựng lại khi dữ liệu thực sự thay đổi.
+        """
+        data = self.get_bootstrap_static(force_refresh)
+        bootstrap = self._bootstrap
+        if bootstrap is None or bootstrap.raw is not data:
+            bootstrap = self._bootstrap = Bootstrap(data)
+        return bootstrap
+
+
+class ManagerInfo:
+    """Các trường của entry/{id}/ mà app sử dụng (không giữ toàn bộ JSON thô)."""
+    __slots__ = ('id', 'player_first_name', 'player_last_name', 'name', 'player_region_name',
+                 'summary_overall_points', 'summary_overall_rank')
+
+    def __init__(self, **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, fields.get(slot))
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'ManagerInfo':
+        return cls(**data)
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.player_first_name} {self.player_last_name}"
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class ManagerAggregates:
+    """Thống kê cộng dồn của một manager, mỗi gameweek mới được cộng vào trong O(1).
+
+    best/worst là vị trí của gameweek điểm cao/thấp nhất trong history (gameweek sớm hơn khi
+    bằng điểm), form giữ điểm của FORM_GAMEWEEKS gameweek gần nhất.
+    """
+    __slots__ = ('gameweeks_played', 'total_points', 'best', 'worst', 'bench_points',
+                 'transfers_cost', 'form', 'form_total')
+
+    def __init__(self, form_gameweeks: int = FORM_GAMEWEEKS):
+        self.gameweeks_played = 0
+        self.total_points = 0
+        self.best: Optional[int] = None
+        self.worst: Optional[int] = None
+        self.bench_points = 0
+        self.transfers_cost = 0
+        self.form = deque(maxlen=form_gameweeks)
+        self.form_total = 0
+
+    def add(self, points: int, points_on_bench: int, transfers_cost: int, best_points: int, worst_points: int):
+        """Cộng một gameweek mới; best_points/worst_points là điểm hiện tại của best/worst."""
+        index = self.gameweeks_played
+        if self.best is None or points > best_points:
+            self.best = index
+        if self.worst is None or points < worst_points:
+            self.worst = index
+        self.gameweeks_played += 1
+        self.total_points += points
+        self.bench_points += points_on_bench
+        self.transfers_cost += transfers_cost
+        if len(self.form) == self.form.maxlen:
+            self.form_total -= self.form[0]
+        self.form.append(points)
+        self.form_total += points
+
+    def copy(self) -> 'ManagerAggregates':
+        other = ManagerAggregates.__new__(ManagerAggregates)
+        for slot in self.__slots__:
+            setattr(other, slot, getattr(self, slot))
+        other.form = deque(self.form, maxlen=self.form.maxlen)
+        return other
+
+    def extend(self, history: 'ManagerHistory'):
+        """Cộng các gameweek của history chưa có trong aggregates."""
+        points = history.column('points')
+        bench = history.column('points_on_bench')
+        costs = history.column('event_transfers_cost')
+        for i in range(self.gameweeks_played, len(history)):
+            self.add(points[i], bench[i], costs[i],
+                     points[self.best] if self.best is not None else 0,
+                     points[self.worst] if self.worst is not None else 0)
+
+    @property
+    def average_points(self) -> float:
+        return self.total_points / self.gameweeks_played if self.gameweeks_played else 0
+
+    @property
+    def form_average(self) -> float:
+        return self.form_total / len(self.form) if self.form else 0
+
+
+class ManagerHistory:
+    """History mùa giải hiện tại của manager dạng cột, lưu trong một array('i') liền khối.
+
+    Dữ liệu gồm len(FIELDS) cột nối tiếp nhau, mỗi cột có một phần tử cho mỗi gameweek
+    manager đã chơi; các cột rank trong NULLABLE không có (None) được lưu là 0. Thống kê cộng dồn
+    (aggregates) được tính một lần và chuyển tiếp sang history mới khi chỉ có thêm gameweek.
+    """
+    __slots__ = ('data', 'size', '_aggregates')
+
+    FIELDS = ('event', 'points', 'total_points', 'rank', 'rank_sort', 'overall_rank', 'percentile_rank',
+              'bank', 'value', 'event_transfers', 'event_transfers_cost', 'points_on_bench')
+    INDEX = {field: i for i, field in enumerate(FIELDS)}
+    NULLABLE = frozenset(('rank', 'rank_sort', 'overall_rank', 'percentile_rank'))
+
+    def __init__(self, data: array, size: int):
+        self.data = data
+        self.size = size
+        self._aggregates: Optional[ManagerAggregates] = None
+
+    @classmethod
+    def from_json(cls, history: Dict, previous: Optional['ManagerHistory'] = None) -> 'ManagerHistory':
+        """Dựng history từ JSON; nếu previous là phần đầu không đổi thì dùng tiếp aggregates của nó."""
+        rows = history.get('current') or []
+        data = array('i', (row.get(field) or 0 for field in cls.FIELDS for row in rows))
+        result = cls(data, len(rows))
+        if previous is not None and previous._aggregates is not None and result.extends(previous):
+            # Sao chép để request đang đọc history cũ không thấy aggregates của history mới
+            result._aggregates = previous._aggregates.copy()
+            result._aggregates.extend(result)
+        return result
+
+    def __len__(self) -> int:
+        return self.size
+
+    def column(self, field: str) -> array:
+        start = self.INDEX[field] * self.size
+        return self.data[start:start + self.size]
+
+    def columns(self) -> np.ndarray:
+        """Mảng NumPy (len(FIELDS) x số gameweek) dùng chung bộ nhớ với data."""
+        return np.frombuffer(self.data, dtype=np.intc).reshape(len(self.FIELDS), self.size)
+
+    def extends(self, other: 'ManagerHistory') -> bool:
+        """True nếu other là phần đầu của history này (các gameweek cũ không bị FPL sửa lại)."""
+        if other.size > self.size:
+            return False
+        return bool(np.array_equal(self.columns()[:, :other.size], other.columns()))
+
+    @property
+    def aggregates(self) -> ManagerAggregates:
+        if self._aggregates is None:
+            aggregates = ManagerAggregates()
+            aggregates.extend(self)
+            self._aggregates = aggregates
+        return self._aggregates
+
+    def row(self, index: int) -> Dict:
+        """Dòng history thứ index theo định dạng của FPL API."""
+        return {
+            field: (value or None) if field in self.NULLABLE else value
+            for field, value in zip(self.FIELDS, self.data[index::self.size])
+        }
+
+    def rows(self) -> List[Dict]:
+        """Dựng lại các dòng history theo định dạng của FPL API."""
+        columns = [self.column(field) for field in self.FIELDS]
+        return [
+            {
+                field: (value or None) if field in self.NULLABLE else value
+                for field, value in zip(self.FIELDS, values)
+            }
+            for values in zip(*columns)
+        ]
+
+
+class ManagerRecord:
+    """Dữ liệu của một manager trong bộ nhớ: info, history (None nếu chưa tải) và thời điểm cập nhật."""
+    __slots__ = ('info', 'history', 'last_updated')
+
+    def __init__(self, info: ManagerInfo, history: Optional[ManagerHistory] = None,
+                 last_updated: Optional[datetime] = None):
+        self.info = info
+        self.history = history
+        self.last_updated = last_updated
+
+    @classmethod
+    def from_json(cls, info: Dict, history: Optional[Dict] = None,
+                  last_updated: Optional[datetime] = None) -> 'ManagerRecord':
+        return cls(
+            ManagerInfo.from_json(info),
+            ManagerHistory.from_json(history) if history is not None else None,
+            last_updated
+        )
+
+
+class ManagerRegistry:
+    """ManagerRecord theo manager ID, giới hạn max_entries và loại bỏ manager ít được dùng nhất.
+
+    Manager bị loại vẫn còn trong ManagerStore nên lần truy cập sau chỉ cần nạp lại từ store.
+    """
+
+    def __init__(self, max_entries: int = TRACKER_MAX_MANAGERS):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data: 'OrderedDict[int, ManagerRecord]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, manager_id: int) -> Optional[ManagerRecord]:
+        with self._lock:
+            record = self._data.get(manager_id)
+            if record is not None:
+                self._data.move_to_end(manager_id)
+            return record
+
+    def __setitem__(self, manager_id: int, record: ManagerRecord):
+        with self._lock:
+            self._data[manager_id] = record
+            self._data.move_to_end(manager_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, manager_id: int, default=None) -> Optional[ManagerRecord]:
+        with self._lock:
+            return self._data.pop(manager_id, default)
+
+    def __contains__(self, manager_id: int) -> bool:
+        return manager_id in self._data
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ManagerStore:
+    """Lưu info, history và last_updated của managers vào database.
+
+    Dữ liệu được chia sẻ giữa các gunicorn worker và giữ lại sau khi restart.
+    Lỗi database chỉ được log lại, tracker sẽ quay về gọi FPL API như bình thường.
+    """
+
+    def __init__(self, url: str = DATABASE_URL):
+        # Heroku/Render cung cấp URL dạng postgres://, SQLAlchemy cần postgresql://
+        if url.startswith('postgres://'):
+            url = url.replace('postgres://', 'postgresql://', 1)
+        self.engine = create_engine(url, pool_pre_ping=True)
+        # Ghi bằng INSERT ... ON CONFLICT DO UPDATE của dialect: một câu lệnh nguyên tử, nên hai
+        # worker cùng ghi một manager không bị IntegrityError như update rồi insert
+        upserts = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+        if self.engine.dialect.name not in upserts:
+            raise ValueError(f"ManagerStore không hỗ trợ database {self.engine.dialect.name} (cần PostgreSQL hoặc SQLite)")
+        self._insert = upserts[self.engine.dialect.name]
+        self.metadata = MetaData()
+        self.managers = Table(
+            'fpl_managers', self.metadata,
+            Column('manager_id', BigInteger, primary_key=True, autoincrement=False),
+            Column('info', Text, nullable=False),
+            Column('history', Text),
+            Column('last_updated', DateTime),
+        )
+        # Đội hình theo (manager, gameweek), chỉ lưu sau deadline nên không bao giờ thay đổi.
+        # final=True khi gameweek đã kết thúc và entry_history (điểm, xếp hạng) là chính thức.
+        self.picks = Table(
+            'fpl_picks', self.metadata,
+            Column('manager_id', BigInteger, primary_key=True, autoincrement=False),
+            Column('gameweek', Integer, primary_key=True, autoincrement=False),
+            Column('picks', Text, nullable=False),
+            Column('final', Boolean, nullable=False, default=False),
+        )
+        self.metadata.create_all(self.engine)
+
+    def get(self, manager_id: int) -> Optional[Dict]:
+        """Đọc bản ghi của manager, trả về None nếu chưa có hoặc lỗi database."""
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(
+                    select(self.managers).where(self.managers.c.manager_id == manager_id)
+                ).first()
+        except SQLAlchemyError as e:
+            logger.error(f"Error reading manager {manager_id} from store: {e}")
+            return None
+        if row is None:
+            return None
+        return {
+            'info': json.loads(row.info),
+            'history': json.loads(row.history) if row.history else None,
+            'last_updated': row.last_updated
+        }
+
+    def _upsert(self, table: Table, keys: Dict, values: Dict, where=None):
+        """Thêm bản ghi (keys + values), hoặc cập nhật các cột trong values nếu khóa chính đã có.
+
+        where giới hạn các bản ghi đã có được phép cập nhật. Ném SQLAlchemyError khi lỗi.
+        """
+        statement = self._insert(table).values(**keys, **values)
+        statement = statement.on_conflict_do_update(index_elements=list(keys), set_=values, where=where)
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+
+    def _save_manager(self, manager_id: int, values: Dict):
+        try:
+            self._upsert(self.managers, {'manager_id': manager_id}, values)
+        except SQLAlchemyError as e:
+            logger.error(f"Error saving manager {manager_id} to store: {e}")
+
+    def save_info(self, manager_id: int, info: Dict):
+        self._save_manager(manager_id, {'info': json.dumps(info)})
+
+    def save_history(self, manager_id: int, info: Dict, history: Dict, last_updated: datetime):
+        self._save_manager(manager_id, {
+            'info': json.dumps(info),
+            'history': json.dumps(history),
+            'last_updated': last_updated
+        })
+
+    def get_picks_many(self, gameweek: int, manager_ids: List[int]) -> Dict[int, tuple]:
+        """Đọc đội hình đã lưu của nhiều managers, trả về manager_id -> (picks, final)."""
+        records = {}
+        try:
+            with self.engine.connect() as conn:
+                for i in range(0, len(manager_ids), 500):
+                    rows = conn.execute(
+                        select(self.picks).where(
+                            self.picks.c.gameweek == gameweek,
+                            self.picks.c.manager_id.in_(manager_ids[i:i + 500])
+                        )
+                    )
+                    for row in rows:
+                        records[row.manager_id] = (json.loads(row.picks), row.final)
+        except SQLAlchemyError as e:
+            logger.error(f"Error reading GW{gameweek} picks from store: {e}")
+        return records
+
+    def save_picks(self, manager_id: int, gameweek: int, picks: Dict, final: bool):
+        try:
+            # Bản final đã chính thức, không bị worker khác ghi đè bằng entry_history cũ hơn
+            self._upsert(self.picks, {'manager_id': manager_id, 'gameweek': gameweek},
+                         {'picks': json.dumps(picks), 'final': final}, where=~self.picks.c.final)
+        except SQLAlchemyError as e:
+            logger.error(f"Error saving GW{gameweek} picks of manager {manager_id} to store: {e}")
+
+# Thread pool dùng chung cho việc gọi upstream song song theo từng manager
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix='fpl-fetch')
+
+def fan_out(func, keys: List, deadline: Optional[float] = None,
+            executor: Optional[ThreadPoolExecutor] = None) -> tuple:
+    """Chạy func(key) song song cho từng key, trả về (results, errors) dạng dict theo key.
+
+    Lỗi của từng key được cô lập trong errors. deadline là mốc time.monotonic();
+    các key chưa xong khi hết hạn được ghi nhận là TimeoutError. executor mặc định là fetch_executor.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + REQUEST_DEADLINE
+    if keys:
+        record_fanout(len(keys))
+    futures = {(executor or fetch_executor).submit(func, key): key for key in keys}
+    done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+
+    results, errors = {}, {}
+    for future in done:
+        key = futures[future]
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            errors[key] = e
+    for future in not_done:
+        future.cancel()
+        errors[futures[future]] = TimeoutError(f"Deadline exceeded for {futures[future]}")
+    return results, errors
+
 class FantasyStatsTracker:
-    def __init__(self):
+    def __init__(self, store: Optional[ManagerStore] = None):
         self.api = FantasyAPI()
-        self.managers_data = {}
-        
+        self.store = store
+        # Bản sao trong bộ nhớ của worker (giới hạn LRU), nguồn dữ liệu chung là self.store
+        self.managers_data = ManagerRegistry()
+        self.freshness = FreshnessPolicy(self.api)
+
     def add_manager(self, manager_id: int) -> bool:
-        """Thêm manager vào danh sách theo dõi"""
+        """Thêm manager vào danh sách theo dõi, ưu tiên dữ liệu đã có trong store"""
+        if self.store:
+            record = self.store.get(manager_id)
+            if record:
+                self.managers_data[manager_id] = ManagerRecord.from_json(**record)
+                return True
         try:
             manager_info = self.api.get_manager_info(manager_id)
-            self.managers_data[manager_id] = {
-                'info': manager_info,
-                'history': None,
-                'last_updated': None
-            }
+            self.managers_data[manager_id] = ManagerRecord.from_json(manager_info)
+            if self.store:
+                self.store.save_info(manager_id, manager_info)
             return True
         except (ManagerNotFound, FPLAPIError) as e:
             logger.error(f"Error adding manager {manager_id}: {e}")
             return False
     
-    def update_manager_data(self, manager_id: int):
-        """Cập nhật dữ liệu của manager. Ném ra exception khi có lỗi."""
-        if manager_id not in self.managers_data:
+    def update_manager_data(self, manager_id: int, force_refresh: bool = False):
+        """Cập nhật dữ liệu của manager. Ném ra exception khi có lỗi.
+
+        Mặc định chỉ tải lại khi history đã cũ theo FreshnessPolicy; force_refresh=True luôn tải lại.
+        Khi tải lại, history và info luôn được revalidate với upstream (ETag, 304 nếu chưa đổi) thay
+        vì lấy từ response cache: bản trong cache có thể đã tải trước mốc của FreshnessPolicy (ví dụ
+        trước khi gameweek được data_checked) mà vẫn bị đóng dấu last_updated là bây giờ.
+        """
+        record = self.managers_data.get(manager_id)
+        if record is None:
             raise FPLAPIError(f"Attempted to update non-tracked manager {manager_id}")
         
+        if not force_refresh and (self.is_fresh(manager_id) or self._load_fresh_record(manager_id)):
+            return
+
         try:
-            history = self.api.get_manager_history(manager_id)
-            self.managers_data[manager_id]['history'] = history
-            self.managers_data[manager_id]['last_updated'] = datetime.now()
+            history = self.api.get_manager_history(manager_id, force_refresh=True)
+            self._refresh_info(manager_id, record)
+            self._apply_history(manager_id, record, history)
         except (ManagerNotFound, FPLAPIError) as e:
             logger.error(f"Failed to update manager {manager_id}: {e}")
-            self.managers_data[manager_id]['history'] = None
+            record.history = None
             raise # Ném lại lỗi để route có thể xử lý
+
+    def _load_fresh_record(self, manager_id: int) -> bool:
+        """Nạp bản ghi từ store nếu worker khác đã cập nhật history gần đây."""
+        if not self.store:
+            return False
+        record = self.store.get(manager_id)
+        if record and record['history'] and self.freshness.is_fresh(record['last_updated']):
+            self.managers_data[manager_id] = ManagerRecord.from_json(**record)
+            return True
+        return False
+
+    def _refresh_info(self, manager_id: int, record: ManagerRecord):
+        """Tải lại entry/ cùng với history: tổng điểm và thứ hạng (summary_overall_*) đổi theo
+        gameweek nên info dùng chung mốc cập nhật (last_updated) với history. Lỗi thì giữ info cũ."""
+        try:
+            record.info = ManagerInfo.from_json(self.api.get_manager_info(manager_id, force_refresh=True))
+        except FPLAPIError as e:
+            logger.warning(f"Could not refresh info of manager {manager_id}, keeping the previous one: {e}")
+
+    def _apply_history(self, manager_id: int, record: ManagerRecord, history: Dict):
+        """Ghi history mới vào bộ nhớ của worker (nạp lại record nếu vừa bị LRU loại) và store."""
+        last_updated = datetime.now()
+        record.history = ManagerHistory.from_json(history, previous=record.history)
+        record.last_updated = last_updated
+        self.managers_data[manager_id] = record
+        if self.store:
+            self.store.save_history(manager_id, record.info.to_dict(), history, last_updated)
     
-    def get_manager_stats(self, manager_id: int) -> Optional[Dict]:
-        """Lấy thống kê chi tiết của manager"""
-        if manager_id not in self.managers_data:
-            return None
-        
-        data = self.managers_data[manager_id]
-        if not data['history']:
-            return None
-        
-        history = data['history']
-        current_season = history.get('current', [])
-        
-        if not current_season:
+    def get_gameweek_picks_many(self, manager_ids: List[int], gameweek: int, force_refresh: bool = False,
+                                deadline: Optional[float] = None, api: Optional[FantasyAPI] = None) -> tuple:
+        """Lấy đội hình của nhiều managers trong một gameweek, trả về (picks, errors) theo ID.
+
+        Sau deadline đội hình không thể thay đổi nên được lưu vĩnh viễn trong store và đọc
+        lại bằng một truy vấn; chỉ gọi FPL API cho managers chưa có trong store, hoặc
+        để lấy entry_history chính thức một lần sau khi gameweek được data_checked.
+        entry_history của bản chưa final là giá trị lúc tải, chỉ bản final mới dùng được làm điểm.
+        api là client dùng để tải picks (mặc định self.api; export dùng client riêng).
+        """
+        api = api or self.api
+        bootstrap = self.api.get_bootstrap()
+        event = bootstrap.gameweek(gameweek) or {}
+        deadline_passed = bootstrap.deadline_passed(gameweek)
+        final = bool(event.get('finished') and event.get('data_checked'))
+
+        results = {}
+        if self.store and deadline_passed and not force_refresh:
+            for manager_id, (picks, stored_final) in self.store.get_picks_many(gameweek, manager_ids).items():
+                if stored_final or not final:
+                    results[manager_id] = picks
+
+        def fetch(manager_id):
+            # Bản final được lưu vĩnh viễn nên revalidate với upstream, không lấy bản trong response
+            # cache có thể đã tải trước khi data_checked
+            picks = api.get_gameweek_picks(manager_id, gameweek, force_refresh=force_refresh or final)
+            if self.store and deadline_passed:
+                self.store.save_picks(manager_id, gameweek, picks, final)
+            return picks
+
+        fetched, errors = fan_out(fetch, [manager_id for manager_id in manager_ids if manager_id not in results],
+                                  deadline, api.executor)
+        results.update(fetched)
+        return results, errors
+
+    def is_fresh(self, manager_id: int) -> bool:
+        """History của manager trong bộ nhớ còn mới theo FreshnessPolicy."""
+        record = self.managers_data.get(manager_id)
+        if record is None or record.history is None:
+            return False
+        return self.freshness.is_fresh(record.last_updated)
+
+    def get_managers_stats(self, manager_ids: List[int], force_refresh: bool = False,
+                           deadline: Optional[float] = None) -> tuple:
+        """Lấy thống kê của nhiều manager cùng lúc, trả về (stats, errors) dạng dict theo ID.
+
+        Manager chưa theo dõi được thêm vào, chỉ history đã cũ mới được tải lại (song song).
+        """
+        if deadline is None:
+            deadline = time.monotonic() + REQUEST_DEADLINE
+
+        def refresh(manager_id):
+            if manager_id not in self.managers_data and not self.add_manager(manager_id):
+                raise ManagerNotFound(f"Manager {manager_id} not found")
+            if force_refresh or not self.is_fresh(manager_id):
+                self.update_manager_data(manager_id, force_refresh=force_refresh)
+
+        _, errors = fan_out(refresh, manager_ids, deadline)
+
+        stats = {}
+        for manager_id in manager_ids:
+            if manager_id in errors:
+                continue
+            manager_stats = self.get_manager_stats(manager_id)
+            if manager_stats:
+                stats[manager_id] = manager_stats
+            else:
+                errors[manager_id] = FPLAPIError(f"No current season data for manager {manager_id}")
+        return stats, errors
+
+    def get_manager_stats(self, manager_id: int, include_gameweeks: bool = True) -> Optional[Dict]:
+        """Lấy thống kê chi tiết của manager.
+
+        Các thống kê tổng hợp đọc từ ManagerAggregates; include_gameweeks=False bỏ qua danh sách
+        gameweek_points khi chỉ cần số liệu tổng.
+        """
+        record = self.managers_data.get(manager_id)
+        if record is None or not record.history:
             return None
-        
-        # Tính toán các thống kê
-        total_points = sum(gw['points'] for gw in current_season)
-        gameweeks_played = len(current_season)
-        avg_points = total_points / gameweeks_played if gameweeks_played > 0 else 0
-        
-        highest_gw = max(current_season, key=lambda x: x['points']) if current_season else None
-        lowest_gw = min(current_season, key=lambda x: x['points']) if current_season else None
-        
+
+        history = record.history
+        aggregates = history.aggregates
+        stats = {
+            'manager_info': record.info.to_dict(),
+            'total_points': aggregates.total_points,
+            'gameweeks_played': aggregates.gameweeks_played,
+            'average_points': round(aggregates.average_points, 1),
+            'highest_gameweek': history.row(aggregates.best),
+            'lowest_gameweek': history.row(aggregates.worst),
+            'form': round(aggregates.form_average, 1),
+            'total_bench_points': aggregates.bench_points,
+            'total_transfers_cost': aggregates.transfers_cost,
+            'last_updated': record.last_updated
+        }
+        if not include_gameweeks:
+            return stats
+
         # Điểm theo từng gameweek
-        gameweek_points = [
+        stats['gameweek_points'] = [
             {
                 'gameweek': gw['event'],
                 'points': gw['points'],
@@ -173,75 +1541,1041 @@ class FantasyStatsTracker:
                 'event_transfers_cost': gw['event_transfers_cost'],
                 'points_on_bench': gw['points_on_bench']
             }
-            for gw in current_season
+            for gw in history.rows()
         ]
-        
-        return {
-            'manager_info': data['info'],
-            'total_points': total_points,
-            'gameweeks_played': gameweeks_played,
-            'average_points': round(avg_points, 1),
-            'highest_gameweek': highest_gw,
-            'lowest_gameweek': lowest_gw,
-            'gameweek_points': gameweek_points,
-            'last_updated': data['last_updated']
-        }
+        return stats
     
-    def compare_managers(self, manager_ids: List[int]) -> Dict:
-        """So sánh nhiều managers"""
+    def season_matrix(self, manager_ids: List[int]) -> 'SeasonMatrix':
+        """Dựng ma trận mùa giải (managers x gameweeks) cho các managers có history."""
+        histories = {}
+        for manager_id in manager_ids:
+            record = self.managers_data.get(manager_id)
+            if record is not None and record.history:
+                histories[manager_id] = record.history
+        return SeasonMatrix(histories)
+
+    def compare_managers(self, manager_ids: List[int], layout: str = 'rows') -> Dict:
+        """So sánh nhiều managers.
+
+        layout='rows' giữ định dạng cũ (gameweek_comparison là danh sách theo gameweek),
+        layout='columns' trả về dạng cột gọn hơn từ SeasonMatrix.to_columns().
+        """
         comparison = {
-            'managers': [],
-            'gameweek_comparison': []
+            'managers': []
         }
         
         # Lấy data của các managers
         managers_stats = []
         for manager_id in manager_ids:
-            stats = self.get_manager_stats(manager_id)
+            stats = self.get_manager_stats(manager_id, include_gameweeks=layout == 'rows')
             if stats:
-                managers_stats.append({
+                manager = {
                     'id': manager_id,
                     'name': stats['manager_info']['player_first_name'] + ' ' + stats['manager_info']['player_last_name'],
                     'team_name': stats['manager_info']['name'],
                     'total_points': stats['total_points'],
-                    'average_points': stats['average_points'],
-                    'gameweeks': stats['gameweek_points']
-                })
+                    'average_points': stats['average_points']
+                }
+                if layout == 'rows':
+                    manager['gameweeks'] = stats['gameweek_points']
+                managers_stats.append(manager)
         
         comparison['managers'] = managers_stats
-        
-        # Tạo comparison theo gameweek
-        if managers_stats:
-            max_gameweeks = max(len(m['gameweeks']) for m in managers_stats)
-            
-            for gw in range(1, max_gameweeks + 1):
-                gw_data = {'gameweek': gw, 'managers': []}
-                
-                for manager in managers_stats:
-                    gw_points = next((g['points'] for g in manager['gameweeks'] if g['gameweek'] == gw), 0)
-                    gw_total = next((g['total_points'] for g in manager['gameweeks'] if g['gameweek'] == gw), 0)
-                    
-                    gw_data['managers'].append({
-                        'id': manager['id'],
-                        'name': manager['name'],
-                        'points': gw_points,
-                        'total_points': gw_total
-                    })
-                
-                comparison['gameweek_comparison'].append(gw_data)
+        matrix = self.season_matrix([manager['id'] for manager in managers_stats])
+
+        if layout == 'columns':
+            comparison['columns'] = matrix.to_columns()
+            return comparison
+
+        # Tạo comparison theo gameweek từ ma trận (không phải tìm kiếm tuyến tính)
+        names = [manager['name'] for manager in managers_stats]
+        points = matrix.points.T.tolist()
+        totals = matrix.total_points.T.tolist()
+        comparison['gameweek_comparison'] = [
+            {
+                'gameweek': gw,
+                'managers': [
+                    {'id': manager_id, 'name': name, 'points': gw_points[i], 'total_points': gw_totals[i]}
+                    for i, (manager_id, name) in enumerate(zip(matrix.manager_ids, names))
+                ]
+            }
+            for gw, gw_points, gw_totals in zip(matrix.gameweeks, points, totals)
+        ]
         
         return comparison
 
+
+class SeasonMatrix:
+    """Dữ liệu mùa giải dạng cột: mỗi chỉ số là mảng NumPy (managers x gameweeks).
+
+    Cột j ứng với gameweek j + 1; gameweek manager không có dữ liệu được điền 0
+    (total_points và rank giữ giá trị của gameweek trước đó).
+    """
+
+    def __init__(self, histories: Dict[int, ManagerHistory]):
+        self.manager_ids = list(histories)
+        columns = [history.columns() for history in histories.values()]
+        field = ManagerHistory.INDEX
+        num_gameweeks = max((int(cols[field['event']].max()) for cols in columns if cols.shape[1]), default=0)
+        self.gameweeks = list(range(1, num_gameweeks + 1))
+
+        shape = (len(self.manager_ids), num_gameweeks)
+        self.points = np.zeros(shape, dtype=np.int32)
+        self.total_points = np.zeros(shape, dtype=np.int32)
+        self.rank = np.zeros(shape, dtype=np.int64)
+        self.transfers_cost = np.zeros(shape, dtype=np.int32)
+        self.bench_points = np.zeros(shape, dtype=np.int32)
+        self.played = np.zeros(shape, dtype=bool)
+
+        for row, cols in enumerate(columns):
+            index = cols[field['event']] - 1
+            self.points[row, index] = cols[field['points']]
+            self.total_points[row, index] = cols[field['total_points']]
+            self.rank[row, index] = cols[field['overall_rank']]
+            self.transfers_cost[row, index] = cols[field['event_transfers_cost']]
+            self.bench_points[row, index] = cols[field['points_on_bench']]
+            self.played[row, index] = True
+
+        if num_gameweeks:
+            # Forward-fill total_points/rank cho các gameweek bị thiếu
+            index = np.where(self.played, np.arange(num_gameweeks), 0)
+            np.maximum.accumulate(index, axis=1, out=index)
+            rows = np.arange(len(self.manager_ids))[:, None]
+            started = self.played.cumsum(axis=1) > 0
+            self.total_points = np.where(started, self.total_points[rows, index], 0)
+            self.rank = np.where(started, self.rank[rows, index], 0)
+
+    def cumulative_points(self) -> np.ndarray:
+        """Tổng điểm tích lũy sau khi trừ phí chuyển nhượng."""
+        return np.cumsum(self.points - self.transfers_cost, axis=1)
+
+    def gap_to_leader(self) -> np.ndarray:
+        """Khoảng cách tổng điểm tới người dẫn đầu (trong nhóm được so sánh) ở mỗi gameweek."""
+        if not self.manager_ids:
+            return self.total_points
+        return self.total_points.max(axis=0) - self.total_points
+
+    def league_position(self) -> np.ndarray:
+        """Thứ hạng (1 = dẫn đầu) trong nhóm được so sánh theo tổng điểm ở mỗi gameweek."""
+        order = np.argsort(-self.total_points, axis=0, kind='stable')
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(1, len(self.manager_ids) + 1)[:, None], axis=0)
+        return positions
+
+    def rank_movement(self) -> np.ndarray:
+        """Thay đổi overall rank so với gameweek trước (dương = tăng hạng)."""
+        movement = np.zeros_like(self.rank)
+        movement[:, 1:] = self.rank[:, :-1] - self.rank[:, 1:]
+        movement[:, 1:][self.rank[:, :-1] == 0] = 0
+        return movement
+
+    def to_columns(self) -> Dict:
+        """Dạng cột cho API: mỗi chỉ số là danh sách theo manager, mỗi phần tử là danh sách theo gameweek."""
+        return {
+            'manager_ids': self.manager_ids,
+            'gameweeks': self.gameweeks,
+            'points': self.points.tolist(),
+            'total_points': self.total_points.tolist(),
+            'rank': self.rank.tolist(),
+            'transfers_cost': self.transfers_cost.tolist(),
+            'bench_points': self.bench_points.tolist(),
+            'cumulative_points': self.cumulative_points().tolist(),
+            'gap_to_leader': self.gap_to_leader().tolist(),
+            'league_position': self.league_position().tolist(),
+            'rank_movement': self.rank_movement().tolist()
+        }
+
+
+class LiveScoringEngine:
+    """Tính điểm live của nhiều managers, cập nhật tăng dần theo các cầu thủ thay đổi điểm.
+
+    Đội hình của các managers là hai ma trận (managers x 15) element/multiplier, giữ nguyên
+    trong suốt gameweek. Từ đó engine dựng chỉ mục ngược element -> (hàng manager, multiplier)
+    dạng CSR. Mỗi lần có dữ liệu live mới, điểm cầu thủ được so với lần trước và chỉ phần
+    chênh lệch được cộng vào điểm của các managers sở hữu cầu thủ thay đổi, nên chi phí một
+    lần cập nhật tỉ lệ với số cầu thủ thay đổi chứ không phải số managers.
+    """
+
+    SQUAD_SIZE = 15
+
+    def __init__(self, capacity: int = 64):
+        self.gameweek: Optional[int] = None
+        self.element_points = np.zeros(1, dtype=np.int32)
+        self.elements = np.zeros((capacity, self.SQUAD_SIZE), dtype=np.int32)
+        self.multipliers = np.zeros((capacity, self.SQUAD_SIZE), dtype=np.int32)
+        self.scores = np.zeros(capacity, dtype=np.int64)
+        self.manager_ids: List[int] = []  # row -> manager_id
+        self.rows: Dict[int, int] = {}     # manager_id -> row
+        self._reset_index()
+
+    def _reset_index(self):
+        # owner_ptr[e]:owner_ptr[e + 1] là đoạn của element e trong owner_rows/owner_multipliers;
+        # None nghĩa là picks đã thay đổi và chỉ mục cần dựng lại
+        self._owner_ptr: Optional[np.ndarray] = None
+        self._owner_rows = np.zeros(0, dtype=np.int64)
+        self._owner_multipliers = np.zeros(0, dtype=np.int32)
+
+    def reset(self, gameweek: int):
+        """Xóa toàn bộ picks khi chuyển sang gameweek khác."""
+        self.gameweek = gameweek
+        self.element_points = np.zeros(1, dtype=np.int32)
+        self.elements[:] = 0
+        self.multipliers[:] = 0
+        self.scores[:] = 0
+        self.manager_ids = []
+        self.rows = {}
+        self._reset_index()
+
+    def has_picks(self, manager_id: int) -> bool:
+        return manager_id in self.rows
+
+    def _points(self, size: int) -> np.ndarray:
+        """Mảng điểm live đủ dài để đánh chỉ số tới element id size - 1."""
+        if size <= len(self.element_points):
+            return self.element_points
+        return np.pad(self.element_points, (0, size - len(self.element_points)))
+
+    def set_picks(self, manager_id: int, picks: Dict):
+        """Ghi đội hình của manager vào ma trận (cầu thủ dự bị có multiplier 0) và tính điểm của hàng đó."""
+        row = self.rows.get(manager_id)
+        if row is None:
+            row = len(self.manager_ids)
+            if row == len(self.elements):
+                self.elements = np.concatenate([self.elements, np.zeros_like(self.elements)])
+                self.multipliers = np.concatenate([self.multipliers, np.zeros_like(self.multipliers)])
+                self.scores = np.concatenate([self.scores, np.zeros_like(self.scores)])
+            self.rows[manager_id] = row
+            self.manager_ids.append(manager_id)
+
+        self.elements[row] = 0
+        self.multipliers[row] = 0
+        for i, p in enumerate(picks['picks'][:self.SQUAD_SIZE]):
+            self.elements[row, i] = p['element']
+            self.multipliers[row, i] = p['multiplier'] if p['position'] <= 11 else 0
+
+        points = self._points(int(self.elements[row].max()) + 1)
+        self.scores[row] = (points[self.elements[row]] * self.multipliers[row]).sum()
+        self._owner_ptr = None
+
+    def _build_index(self):
+        """Dựng chỉ mục ngược element -> các hàng sở hữu (chỉ cầu thủ có multiplier khác 0)."""
+        count = len(self.manager_ids)
+        elements = self.elements[:count].ravel()
+        multipliers = self.multipliers[:count].ravel()
+        owned = np.flatnonzero(multipliers)
+        order = owned[np.argsort(elements[owned], kind='stable')]
+        self._owner_rows = order // self.SQUAD_SIZE
+        self._owner_multipliers = multipliers[order]
+        counts = np.bincount(elements[order], minlength=1)
+        self._owner_ptr = np.concatenate([[0], np.cumsum(counts)])
+
+    def owners(self, element_id: int) -> List[tuple]:
+        """Các cặp (manager_id, multiplier) đang có element_id trong đội hình chính."""
+        if self._owner_ptr is None:
+            self._build_index()
+        if element_id + 1 >= len(self._owner_ptr):
+            return []
+        start, end = self._owner_ptr[element_id], self._owner_ptr[element_id + 1]
+        return [
+            (self.manager_ids[row], multiplier)
+            for row, multiplier in zip(self._owner_rows[start:end].tolist(), self._owner_multipliers[start:end].tolist())
+        ]
+
+    @staticmethod
+    def element_points_array(elements: List[Dict]) -> np.ndarray:
+        """Mảng điểm live theo element id từ live_data['elements']."""
+        if not elements:
+            return np.zeros(1, dtype=np.int32)
+        ids = np.fromiter((el['id'] for el in elements), dtype=np.int32, count=len(elements))
+        values = np.fromiter((el['stats']['total_points'] for el in elements), dtype=np.int32, count=len(elements))
+        points = np.zeros(ids.max() + 1, dtype=np.int32)
+        points[ids] = values
+        return points
+
+    def set_live_elements(self, elements: List[Dict]) -> List[int]:
+        """Cập nhật điểm live từ live_data['elements'], trả về ID các managers có điểm bị ảnh hưởng."""
+        return self.set_element_points(self.element_points_array(elements))
+
+    def set_element_points(self, new_points: np.ndarray) -> List[int]:
+        """Cập nhật điểm live theo element id, trả về ID các managers có điểm bị ảnh hưởng."""
+        size = max(len(new_points), len(self.element_points))
+        old_points = self._points(size)
+        self.element_points = new_points
+        delta = self._points(size) - old_points
+        changed = np.flatnonzero(delta)
+        if not len(changed) or not self.manager_ids:
+            return []
+
+        if self._owner_ptr is None:
+            self._build_index()
+        ptr = self._owner_ptr
+        changed = changed[changed < len(ptr) - 1]
+        starts = ptr[changed]
+        counts = ptr[changed + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return []
+
+        # Vị trí của mọi cặp (hàng, multiplier) sở hữu các element thay đổi trong chỉ mục CSR
+        index = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        rows = self._owner_rows[index]
+        np.add.at(self.scores, rows, np.repeat(delta[changed], counts) * self._owner_multipliers[index])
+        return [self.manager_ids[row] for row in np.unique(rows).tolist()]
+
+    def score(self, manager_id: int) -> int:
+        return int(self.scores[self.rows[manager_id]])
+
+    def totals(self) -> Dict[int, int]:
+        """Điểm live của tất cả managers."""
+        return dict(zip(self.manager_ids, self.scores[:len(self.manager_ids)].tolist()))
+
+
+@dataclass(frozen=True)
+class LiveSnapshot:
+    """Ảnh chụp bất biến của dữ liệu live tại một thời điểm.
+
+    gameweek là vòng is_current (None nếu chưa có), scores_gameweek là vòng dùng
+    cho live-scores (vòng hiện tại hoặc vòng đã kết thúc gần nhất), data_checked là trạng thái
+    data_checked của scores_gameweek.
+    managers: manager_id -> {'live_points', 'entry_points', 'transfers_cost'} hoặc {'error'}.
+    """
+    gameweek: Optional[int]
+    finished: bool
+    scores_gameweek: Optional[int]
+    data_checked: bool = False
+    elements_points: Mapping[int, int] = field(default_factory=lambda: MappingProxyType({}))
+    managers: Mapping[int, Mapping] = field(default_factory=lambda: MappingProxyType({}))
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def is_live(self) -> bool:
+        return self.gameweek is not None and not self.finished
+
+    @property
+    def scores_final(self) -> bool:
+        """Điểm của scores_gameweek đã chính thức: sau khi kết thúc, FPL còn cộng bonus và sửa điểm
+        tới khi data_checked, trong thời gian đó điểm lấy từ LiveScoringEngine thay vì entry_history."""
+        return self.finished and self.data_checked
+
+    def covers(self, manager_ids) -> bool:
+        return all(manager_id in self.managers for manager_id in manager_ids)
+
+
+class LiveArchive:
+    """Lưu các lần poll điểm live vào file nén, mỗi gameweek một file gw{N}.bin, đọc lại qua mmap.
+
+    Mỗi bản ghi gồm header RECORD (magic, thời điểm poll dạng epoch, số element, độ dài dữ liệu
+    nén) và mảng int32 điểm theo element id đã nén zlib. Bản ghi chỉ được thêm khi điểm thay
+    đổi so với lần ghi trước và được ghi bằng một lệnh write ở chế độ append, nên các worker có
+    thể ghi chung một file. Khi đọc, chỉ mục (thời điểm, offset) được dựng tăng dần theo phần
+    file mới ghi thêm và chỉ bản ghi cần dùng mới được giải nén.
+    """
+
+    MAGIC = b'FPLL'
+    RECORD = struct.Struct('<4sdII')
+
+    def __init__(self, directory: str = LIVE_ARCHIVE_DIR):
+        self.directory = directory
+        self._last_written: Dict[int, np.ndarray] = {}
+        # gameweek -> (số byte đã lập chỉ mục, timestamps, offsets)
+        self._index: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def path(self, gameweek: int) -> str:
+        return os.path.join(self.directory, f'gw{gameweek}.bin')
+
+    def gameweeks(self) -> List[int]:
+        """Các gameweek đã có archive."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[2:-4]) for name in names
+                      if name.startswith('gw') and name.endswith('.bin') and name[2:-4].isdigit())
+
+    def append(self, gameweek: int, points: np.ndarray, timestamp: Optional[float] = None) -> bool:
+        """Ghi điểm live của một lần poll, bỏ qua nếu không đổi so với lần ghi trước. Trả về True nếu đã ghi."""
+        points = np.ascontiguousarray(points, dtype='<i4')
+        with self._lock:
+            last = self._last_written.get(gameweek)
+            if last is None:
+                records = self.records(gameweek)
+                last = self.points_at(gameweek) if records else None
+            if last is not None and np.array_equal(last, points):
+                self._last_written[gameweek] = last
+                return False
+            payload = zlib.compress(points.tobytes(), 6)
+            # Làm tròn tới giây để thời điểm trả về cho client (độ chính xác giây) truy vấn lại được đúng bản ghi
+            header = self.RECORD.pack(self.MAGIC, float(int(time.time())) if timestamp is None else timestamp,
+                                      len(points), len(payload))
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(self.path(gameweek), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, header + payload)
+            finally:
+                os.close(fd)
+            self._last_written[gameweek] = points
+            return True
+
+    def records(self, gameweek: int) -> List[float]:
+        """Thời điểm (epoch) của các bản ghi trong archive của gameweek, tăng dần theo thứ tự ghi."""
+        return self._load_index(gameweek)[1]
+
+    def _load_index(self, gameweek: int) -> tuple:
+        indexed, timestamps, offsets = self._index.get(gameweek, (0, [], []))
+        try:
+            size = os.path.getsize(self.path(gameweek))
+        except FileNotFoundError:
+            return 0, [], []
+        if size == indexed:
+            return indexed, timestamps, offsets
+        timestamps, offsets = list(timestamps), list(offsets)
+        with open(self.path(gameweek), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = indexed
+            while offset + self.RECORD.size <= size:
+                magic, timestamp, _, length = self.RECORD.unpack_from(data, offset)
+                if magic != self.MAGIC:
+                    logger.error(f"Live archive GW{gameweek} hỏng tại byte {offset}, bỏ qua phần còn lại")
+                    break
+                if offset + self.RECORD.size + length > size:
+                    break  # bản ghi đang được ghi dở
+                timestamps.append(timestamp)
+                offsets.append(offset)
+                offset += self.RECORD.size + length
+        entry = (offset, timestamps, offsets)
+        self._index[gameweek] = entry
+        return entry
+
+    def _read(self, gameweek: int, offset: int) -> np.ndarray:
+        with open(self.path(gameweek), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            _, _, count, length = self.RECORD.unpack_from(data, offset)
+            start = offset + self.RECORD.size
+            raw = zlib.decompress(data[start:start + length])
+        return np.frombuffer(raw, dtype='<i4', count=count).astype(np.int32)
+
+    def snapshot_at(self, gameweek: int, timestamp: Optional[float] = None) -> Optional[tuple]:
+        """Bản ghi mới nhất tại thời điểm timestamp (mặc định: bản ghi cuối), trả về (timestamp, points)."""
+        _, timestamps, offsets = self._load_index(gameweek)
+        if not timestamps:
+            return None
+        position = len(timestamps) if timestamp is None else bisect_right(timestamps, timestamp)
+        if position == 0:
+            return None
+        return timestamps[position - 1], self._read(gameweek, offsets[position - 1])
+
+    def points_at(self, gameweek: int, timestamp: Optional[float] = None) -> Optional[np.ndarray]:
+        found = self.snapshot_at(gameweek, timestamp)
+        return found[1] if found else None
+
+    def iter_snapshots(self, gameweek: int):
+        """Duyệt (timestamp, points) của mọi bản ghi theo thứ tự thời gian."""
+        _, timestamps, offsets = self._load_index(gameweek)
+        for timestamp, offset in zip(timestamps, offsets):
+            yield timestamp, self._read(gameweek, offset)
+
+
+class ArchiveReplay:
+    """Nguồn dữ liệu live thay cho FantasyAPI, phát lại archive của một gameweek nhanh gấp speed lần.
+
+    Đồng hồ replay bắt đầu từ bản ghi đầu tiên khi tạo đối tượng; get_live_event trả về bản ghi
+    tại thời điểm tương ứng theo cùng định dạng event/{gw}/live/ (chỉ có stats.total_points).
+    """
+
+    def __init__(self, archive: LiveArchive, gameweek: int, speed: float = LIVE_REPLAY_SPEED):
+        self.archive = archive
+        self.gameweek = gameweek
+        self.speed = speed
+        records = archive.records(gameweek)
+        if not records:
+            raise FPLAPIError(f"Không có live archive cho GW{gameweek}")
+        self.start = records[0]
+        self.end = records[-1]
+        self._started = time.monotonic()
+
+    def clock(self) -> float:
+        """Thời điểm (epoch) trong archive mà replay đang phát."""
+        return self.start + (time.monotonic() - self._started) * self.speed
+
+    @property
+    def finished(self) -> bool:
+        return self.clock() >= self.end
+
+    def get_live_event(self, gameweek: int, force_refresh: bool = False) -> Dict:
+        if gameweek != self.gameweek:
+            raise FPLAPIError(f"Replay chỉ có dữ liệu GW{self.gameweek}, không có GW{gameweek}")
+        points = self.archive.points_at(gameweek, min(self.clock(), self.end))
+        return {
+            'elements': [
+                {'id': element_id, 'stats': {'total_points': value}}
+                for element_id, value in enumerate(points.tolist()) if element_id
+            ]
+        }
+
+
+class LivePoller:
+    """Thread nền poll bootstrap-static, event/{gw}/live và picks của các managers đang được xem.
+
+    Mỗi lần poll dựng một LiveSnapshot mới rồi thay thế snapshot cũ (gán tham chiếu là
+    atomic), nên các route chỉ cần đọc snapshot mới nhất mà không phải gọi upstream.
+    Điểm live lấy từ upstream được ghi vào archive (nếu có); live_source (ví dụ ArchiveReplay)
+    thay thế FantasyAPI làm nguồn dữ liệu event/{gw}/live.
+    """
+
+    def __init__(self, tracker: FantasyStatsTracker, archive: Optional[LiveArchive] = None,
+                 live_source: Optional[ArchiveReplay] = None):
+        self.tracker = tracker
+        self.archive = archive
+        self.live_source = live_source
+        self._snapshot: Optional[LiveSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        # Tăng mỗi khi có snapshot mới, các stream SSE chờ trên _changed
+        self.version = 0
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.engine = LiveScoringEngine()
+        # manager_id -> lần cuối được xem (time.monotonic()), sắp theo thời gian xem
+        self._watched: 'OrderedDict[int, float]' = OrderedDict()
+        self._watched_lock = threading.Lock()
+
+    def start(self):
+        """Khởi động thread poll (chỉ một lần cho mỗi worker)."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='fpl-live-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            interval = LIVE_POLL_INTERVAL
+            try:
+                snapshot = self.refresh()
+                if snapshot.scores_final:
+                    interval = IDLE_POLL_INTERVAL
+            except Exception as e:
+                logger.error(f"Live poller failed: {e}")
+            self._stop.wait(interval)
+
+    def _publish(self, snapshot: LiveSnapshot):
+        with self._changed:
+            self._snapshot = snapshot
+            self.version += 1
+            self._changed.notify_all()
+
+    def watch(self, manager_ids):
+        """Đánh dấu managers đang được xem để các lần poll sau tải picks của họ."""
+        now = time.monotonic()
+        with self._watched_lock:
+            for manager_id in manager_ids:
+                self._watched[manager_id] = now
+                self._watched.move_to_end(manager_id)
+            while len(self._watched) > LIVE_WATCH_MAX_MANAGERS:
+                self._watched.popitem(last=False)
+
+    def watched_ids(self) -> List[int]:
+        """Managers được xem trong LIVE_WATCH_TTL giây gần nhất (managers hết hạn bị bỏ)."""
+        expired = time.monotonic() - LIVE_WATCH_TTL
+        with self._watched_lock:
+            while self._watched and next(iter(self._watched.values())) < expired:
+                self._watched.popitem(last=False)
+            return list(self._watched)
+
+    def wait_for_update(self, version: int, timeout: float) -> tuple:
+        """Chờ tới khi có snapshot mới hơn version (tối đa timeout giây), trả về (version, snapshot)."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version, self._snapshot
+
+    def get_snapshot(self, manager_ids: List[int] = (), force_refresh: bool = False) -> LiveSnapshot:
+        """Trả về snapshot mới nhất, chỉ dựng lại khi chưa có hoặc thiếu manager được yêu cầu."""
+        self.watch(manager_ids)
+        snapshot = self._snapshot
+        if not force_refresh and snapshot is not None and snapshot.covers(manager_ids):
+            return snapshot
+        with self._refresh_lock:
+            # Một request khác có thể vừa dựng xong snapshot trong lúc chờ lock
+            snapshot = self._snapshot
+            if not force_refresh and snapshot is not None and snapshot.covers(manager_ids):
+                return snapshot
+            return self._build(manager_ids, force_refresh)
+
+    def refresh(self, manager_ids: List[int] = (), force_refresh: bool = False) -> LiveSnapshot:
+        """Dựng lại snapshot cho các managers đang được xem (và manager_ids)."""
+        with self._refresh_lock:
+            return self._build(manager_ids, force_refresh)
+
+    def _build(self, manager_ids, force_refresh: bool) -> LiveSnapshot:
+        if self.live_source is not None:
+            # Replay: gameweek và trạng thái lấy từ archive đang phát, không phụ thuộc lịch hiện tại
+            gameweek = scores_gameweek = self.live_source.gameweek
+            finished = data_checked = self.live_source.finished
+        else:
+            bootstrap = self.tracker.api.get_bootstrap(force_refresh=force_refresh)
+            current_gw_info = bootstrap.current
+
+            gameweek = current_gw_info['id'] if current_gw_info else None
+            finished = current_gw_info['finished'] if current_gw_info else True
+            scores_gw_info = bootstrap.scores_gameweek
+            if not scores_gw_info:
+                snapshot = LiveSnapshot(gameweek=None, finished=True, scores_gameweek=None, data_checked=True)
+                self._publish(snapshot)
+                return snapshot
+            scores_gameweek = scores_gw_info['id']
+            data_checked = bool(scores_gw_info.get('data_checked'))
+        final = finished and data_checked
+
+        if self.engine.gameweek != scores_gameweek:
+            self.engine.reset(scores_gameweek)
+
+        elements_points = {}
+        live_elements = []
+        # Điểm live được poll tới khi gameweek được data_checked (bonus vẫn được cộng sau khi kết thúc);
+        # replay vẫn đọc archive sau khi phát hết để giữ điểm của bản ghi cuối
+        if not final or self.live_source is not None:
+            try:
+                source = self.live_source or self.tracker.api
+                live_data = source.get_live_event(scores_gameweek, force_refresh=force_refresh)
+                live_elements = live_data['elements']
+                elements_points = {
+                    el['id']: el['stats']['total_points']
+                    for el in live_elements
+                }
+            except Exception as e:
+                logger.error(f"Không thể lấy dữ liệu live event GW{scores_gameweek}: {e}")
+        points = self.engine.element_points_array(live_elements)
+        if self.archive and self.live_source is None and live_elements:
+            try:
+                self.archive.append(scores_gameweek, points)
+            except OSError as e:
+                logger.error(f"Không thể ghi live archive GW{scores_gameweek}: {e}")
+        # Chỉ các managers sở hữu cầu thủ thay đổi điểm được tính lại
+        affected_ids = self.engine.set_element_points(points)
+
+        # Tới khi gameweek được data_checked đội hình đã chốt và điểm lấy từ engine, nên chỉ cần tải
+        # picks của managers mới và dùng lại phần còn lại của snapshot trước; sau đó dựng lại toàn bộ
+        # (để lấy entry_history chính thức)
+        previous = self._snapshot
+        incremental = (not force_refresh and previous is not None and not previous.scores_final
+                       and not final and previous.scores_gameweek == scores_gameweek)
+
+        tracked_ids = list(dict.fromkeys([*self.watched_ids(), *manager_ids]))
+        if incremental:
+            fetch_ids = [manager_id for manager_id in tracked_ids
+                         if manager_id not in previous.managers or not self.engine.has_picks(manager_id)]
+        else:
+            fetch_ids = tracked_ids
+        all_picks, picks_errors = self.tracker.get_gameweek_picks_many(
+            fetch_ids, scores_gameweek, force_refresh=force_refresh
+        )
+        fan_out(self.tracker.add_manager,
+                [manager_id for manager_id in tracked_ids if manager_id not in self.tracker.managers_data])
+
+        # Đội hình không đổi trong gameweek, chỉ ghi vào ma trận một lần
+        for manager_id, picks in all_picks.items():
+            if force_refresh or not self.engine.has_picks(manager_id):
+                self.engine.set_picks(manager_id, picks)
+
+        # Managers không còn được xem bị bỏ khỏi snapshot
+        tracked = set(tracked_ids)
+        managers = {manager_id: live for manager_id, live in previous.managers.items()
+                    if manager_id in tracked} if incremental else {}
+        for manager_id, picks in all_picks.items():
+            entry_history = picks.get('entry_history', {})
+            managers[manager_id] = MappingProxyType({
+                'live_points': self.engine.score(manager_id),
+                'entry_points': entry_history.get('points', 0),
+                'transfers_cost': entry_history.get('event_transfers_cost', 0)
+            })
+        if incremental:
+            for manager_id in affected_ids:
+                live = managers.get(manager_id)
+                if manager_id not in all_picks and live is not None and 'error' not in live:
+                    managers[manager_id] = MappingProxyType({**live, 'live_points': self.engine.score(manager_id)})
+        for manager_id, e in picks_errors.items():
+            logger.warning(f"Could not fetch live picks for manager {manager_id}: {e}")
+            managers[manager_id] = MappingProxyType({'error': str(e)})
+
+        snapshot = LiveSnapshot(
+            gameweek=gameweek,
+            finished=finished,
+            scores_gameweek=scores_gameweek,
+            data_checked=data_checked,
+            elements_points=MappingProxyType(elements_points),
+            managers=MappingProxyType(managers)
+        )
+        self._publish(snapshot)
+        return snapshot
+
 # Khởi tạo tracker
-tracker = FantasyStatsTracker()
+tracker = FantasyStatsTracker(store=ManagerStore())
+# Client của export: thread pool và rate limit riêng, không ghi vào response cache (tránh đẩy bootstrap
+# và dữ liệu dashboard ra khỏi cache); dùng chung circuit breaker vì cùng một upstream
+export_executor = ThreadPoolExecutor(max_workers=EXPORT_MAX_WORKERS, thread_name_prefix='fpl-export')
+export_api = FantasyAPI(UpstreamGateway(EXPORT_RATE_LIMITS, breaker=tracker.api.gateway.breaker),
+                        cacheable=False, executor=export_executor)
+live_archive = LiveArchive() if LIVE_ARCHIVE_ENABLED else None
+live_poller = LivePoller(
+    tracker,
+    archive=live_archive,
+    live_source=ArchiveReplay(live_archive or LiveArchive(), LIVE_REPLAY_GAMEWEEK)
+    if LIVE_REPLAY_GAMEWEEK is not None else None
+)
+encoded_cache = TTLCache(max_bytes=ENCODED_CACHE_MAX_BYTES)
+live_stream_slots = threading.BoundedSemaphore(LIVE_STREAM_MAX_CONNECTIONS)
+
+metrics.gauge('fpl_cache_bytes', 'Dung lượng hiện tại của response cache (byte).',
+              lambda: {(): tracker.api.cache.stats()['bytes']})
+metrics.gauge('fpl_cache_entries', 'Số entry trong response cache.',
+              lambda: {(): tracker.api.cache.stats()['entries']})
+metrics.gauge('fpl_encoded_cache_bytes', 'Dung lượng cache bytes đã nén của response.',
+              lambda: {(): encoded_cache.stats()['bytes']})
+metrics.gauge('fpl_upstream_circuit_open', '1 khi circuit breaker tới FPL API đang mở (hoặc half-open).',
+              lambda: {(): int(tracker.api.gateway.breaker.state != 'closed')})
+metrics.gauge('fpl_upstream_coalesced_requests', 'Số lời gọi upstream được gộp vào request đang chạy (cộng dồn).',
+              lambda: {(): tracker.api.flights.coalesced})
+metrics.gauge('fpl_tracked_managers', 'Số managers đang có trong bộ nhớ của worker.',
+              lambda: {(): len(tracker.managers_data)})
+metrics.gauge('fpl_tracked_managers_evicted', 'Số managers bị loại khỏi bộ nhớ do vượt TRACKER_MAX_MANAGERS.',
+              lambda: {(): tracker.managers_data.evictions})
+
+def wants_refresh() -> bool:
+    """Client yêu cầu bỏ qua cache (?refresh=1) để lấy dữ liệu mới nhất từ FPL."""
+    return request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+def build_live_scores(snapshot: LiveSnapshot, manager_ids: List[int]) -> List[Dict]:
+    """Dựng danh sách điểm live của các managers từ snapshot."""
+    live_scores = []
+    for manager_id in manager_ids:
+        record = tracker.managers_data.get(manager_id)
+        manager_info = record.info.to_dict() if record is not None else {}
+        live = snapshot.managers.get(manager_id)
+        if live is None or 'error' in live:
+            live_scores.append({
+                'id': manager_id,
+                'name': f"{manager_info.get('player_first_name', '')} {manager_info.get('player_last_name', '')}".strip() or f"Manager {manager_id}",
+                'team_name': manager_info.get('name', 'N/A'),
+                'live_points': 'Error',
+                'transfers_cost': 'N/A'
+            })
+            continue
+        live_scores.append({
+            'id': manager_id,
+            'name': f"{manager_info.get('player_first_name', '')} {manager_info.get('player_last_name', '')}".strip(),
+            'team_name': manager_info.get('name', 'N/A'),
+            # entry_history của picks đã lưu chỉ chính thức sau data_checked, trước đó dùng điểm của engine
+            'live_points': live['entry_points'] if snapshot.scores_final else live['live_points'],
+            'transfers_cost': live['transfers_cost']
+        })
+    return live_scores
+
+def merge_live_points(comparison: Dict, force_refresh: bool = False) -> tuple:
+    """Bổ sung điểm live của gameweek hiện tại vào kết quả so sánh, trả về (gameweek, finished)."""
+    snapshot = live_poller.get_snapshot(
+        [manager['id'] for manager in comparison['managers']], force_refresh=force_refresh
+    )
+    current_gameweek = snapshot.gameweek
+    current_gw_finished = snapshot.finished
+
+    if snapshot.is_live:
+        for manager in comparison['managers']:
+            live = snapshot.managers.get(manager['id'])
+            if live is None or 'error' in live:
+                logger.warning(f"Không thể tính live points cho manager {manager['id']}")
+                manager['live_total_points'] = manager['total_points']
+                continue
+            live_points = live['live_points']
+            manager['live_points'] = live_points
+
+            # Cập nhật vào danh sách gameweeks
+            found_gw = False
+            for g in manager.get('gameweeks', []):
+                if g['gameweek'] == current_gameweek:
+                    g['points'] = live_points
+                    g['total_points'] = manager['total_points'] + live_points
+                    found_gw = True
+                    break
+            if not found_gw and 'gameweeks' in manager:
+                manager['gameweeks'].append({
+                    'gameweek': current_gameweek,
+                    'points': live_points,
+                    'total_points': manager['total_points'] + live_points
+                })
+
+            # Thêm field live_total_points
+            manager['live_total_points'] = manager['total_points'] + live_points
+
+    return current_gameweek, current_gw_finished
+
+def parse_manager_ids(ids: str) -> List[int]:
+    """Parse danh sách ID dạng "1,2,3" (bỏ trùng, giữ thứ tự). Ném ValueError nếu không phải số."""
+    return list(dict.fromkeys(int(id) for id in ids.split(',') if id.strip()))
+
+def batched(iterable, size: int):
+    """Chia iterable thành các list tối đa size phần tử mà không đọc trước toàn bộ."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_history(manager_id: int) -> ManagerHistory:
+    """History để export: dùng bản trong bộ nhớ nếu còn mới, nếu không thì tải bằng export_api."""
+    record = tracker.managers_data.get(manager_id)
+    if record is not None and record.history is not None and tracker.is_fresh(manager_id):
+        return record.history
+    return ManagerHistory.from_json(export_api.get_manager_history(manager_id))
+
+def export_info(manager_id: int) -> ManagerInfo:
+    """Thông tin manager để export (không thêm manager vào tracker): bản trong bộ nhớ nếu còn mới
+    (info được tải lại cùng history), nếu không thì tải bằng export_api."""
+    record = tracker.managers_data.get(manager_id)
+    if record is not None and tracker.is_fresh(manager_id):
+        return record.info
+    return ManagerInfo.from_json(export_api.get_manager_info(manager_id))
+
+def is_transient_error(e: Exception) -> bool:
+    """Lỗi do hết deadline hoặc rate limit phía client, thử lại sau là có thể thành công."""
+    return isinstance(e, (TimeoutError, UpstreamUnavailable)) or isinstance(e.__cause__, UpstreamUnavailable)
+
+def export_fetch(fetch, manager_ids: List[int], endpoint: str) -> tuple:
+    """Gọi fetch(ids, deadline) -> (results, errors), thử lại managers gặp lỗi tạm thời.
+
+    Deadline của mỗi lượt tính theo số managers và rate limit export của endpoint (một batch
+    lớn cần lâu hơn REQUEST_DEADLINE); trả về (results, errors) sau lượt cuối.
+    """
+    bucket = export_api.gateway.buckets.get(endpoint)
+    results, errors = {}, {}
+    pending = list(manager_ids)
+    for attempt in range(EXPORT_RETRIES + 1):
+        budget = REQUEST_DEADLINE + (len(pending) / bucket.rate if bucket else 0)
+        fetched, round_errors = fetch(pending, time.monotonic() + budget)
+        results.update(fetched)
+        errors.update(round_errors)
+        for manager_id in fetched:
+            errors.pop(manager_id, None)
+        pending = [manager_id for manager_id, e in round_errors.items() if is_transient_error(e)]
+        if not pending:
+            break
+        logger.warning(f"Export: thử lại {len(pending)} managers ({endpoint}), lượt {attempt + 1}")
+    return results, errors
+
+def export_batches(dataset: str, manager_ids, league_id: Optional[int] = None,
+                   gameweek: Optional[int] = None):
+    """Generator các batch dòng (tuple theo thứ tự cột của EXPORT_DATASETS[dataset]).
+
+    manager_ids có thể là generator (ví dụ entries của league đang được crawl): mỗi lần chỉ
+    EXPORT_BATCH_SIZE managers được tải song song (bằng export_api trên export_executor), nên bộ
+    nhớ không phụ thuộc số managers.
+    Managers vẫn lỗi sau EXPORT_RETRIES lần thử bị bỏ qua và được báo bằng FPLAPIError ném ra
+    sau batch cuối cùng, để export không đầy đủ không bị coi là thành công.
+    """
+    if dataset == 'standings' and league_id is not None:
+        for entries in batched(export_api.iter_league_entries(league_id), EXPORT_BATCH_SIZE):
+            yield [
+                (league_id, entry['entry'], entry['entry_name'], entry['player_name'],
+                 entry['rank'], entry['last_rank'], entry['total'], entry['event_total'])
+                for entry in entries
+            ]
+        return
+
+    failed = {}
+    for batch in batched(manager_ids, EXPORT_BATCH_SIZE):
+        if dataset == 'history':
+            results, errors = export_fetch(
+                lambda ids, deadline: fan_out(export_history, ids, deadline, export_executor), batch, 'history'
+            )
+            rows = []
+            for manager_id in batch:
+                if manager_id in results:
+                    rows.extend((manager_id, *values) for values in results[manager_id].columns().T.tolist())
+        elif dataset == 'picks':
+            results, errors = export_fetch(
+                lambda ids, deadline: tracker.get_gameweek_picks_many(ids, gameweek, deadline=deadline,
+                                                                      api=export_api),
+                batch, 'picks'
+            )
+            rows = [
+                (manager_id, gameweek, pick['element'], pick['position'], pick['multiplier'],
+                 pick['is_captain'], pick['is_vice_captain'])
+                for manager_id in batch if manager_id in results
+                for pick in results[manager_id]['picks']
+            ]
+        else:
+            results, errors = export_fetch(
+                lambda ids, deadline: fan_out(export_info, ids, deadline, export_executor), batch, 'entry'
+            )
+            rows = [
+                (None, manager_id, info.name, info.full_name, info.summary_overall_rank,
+                 None, info.summary_overall_points, None)
+                for manager_id, info in ((manager_id, results.get(manager_id)) for manager_id in batch)
+                if info is not None
+            ]
+        for manager_id, e in errors.items():
+            logger.warning(f"Bỏ qua manager {manager_id} khi export {dataset}: {e}")
+            failed[manager_id] = e
+        yield rows
+
+    if failed:
+        ids = ', '.join(str(manager_id) for manager_id in list(failed)[:20])
+        raise FPLAPIError(f"Export {dataset} thiếu {len(failed)} managers do lỗi: {ids}"
+                          + (', ...' if len(failed) > 20 else ''))
+
+class ChunkSink(io.RawIOBase):
+    """File-like chỉ ghi, giữ bytes đã ghi cho tới khi drain() để stream ra response."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def encode_csv(columns: List[tuple], batches):
+    """Ghi các batch thành CSV, yield một chunk cho mỗi batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def encode_arrow(columns: List[tuple], batches, output_format: str):
+    """Ghi các batch thành Parquet (mỗi batch một row group) hoặc Arrow IPC stream."""
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if output_format == 'parquet' else pa.ipc.new_stream(sink, schema)
+    for rows in batches:
+        if rows:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    # Chỉ ghi footer (Parquet) / end-of-stream (Arrow) khi export đầy đủ; nếu batches ném lỗi
+    # thì file dừng ở đây và không đọc được như một file hoàn chỉnh
+    writer.close()
+    yield sink.drain()
+
+def stats_error_messages(errors: Dict) -> Dict:
+    """Chuyển lỗi theo manager thành thông báo cho client."""
+    error_messages = {}
+    for manager_id, e in errors.items():
+        if isinstance(e, ManagerNotFound):
+            error_messages[manager_id] = f'Không tìm thấy dữ liệu cho manager {manager_id}.'
+        elif isinstance(e, TimeoutError):
+            error_messages[manager_id] = f'Hết thời gian chờ dữ liệu manager {manager_id}.'
+        else:
+            error_messages[manager_id] = f'Lỗi API khi tải dữ liệu cho manager {manager_id}.'
+    return error_messages
+
+@app.before_request
+def start_live_poller():
+    """Khởi động live poller của worker ở request đầu tiên."""
+    if LIVE_POLLER_ENABLED:
+        live_poller.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Ghi thời gian xử lý request (chạy sau cùng trong các after_request)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe('fpl_http_request_duration_seconds', time.perf_counter() - started, (
+            ('route', current_route()), ('method', request.method), ('status', str(response.status_code))
+        ))
+    return response
+
+def negotiate_encoding() -> Optional[str]:
+    """Chọn cách nén theo Accept-Encoding của client: br (nếu có brotli) hoặc gzip."""
+    accept = request.accept_encodings
+    gzip_quality = accept['gzip']
+    brotli_quality = accept['br'] if brotli is not None else 0
+    if brotli_quality and brotli_quality >= gzip_quality:
+        return 'br'
+    return 'gzip' if gzip_quality else None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+@app.after_request
+def compress_response(response):
+    """Nén gzip/brotli các phản hồi lớn (chạy sau add_cache_headers).
+
+    Bytes đã nén được cache theo ETag (hoặc hash) của body gốc nên payload không đổi chỉ
+    phải nén một lần. ETag chuyển thành weak vì body gửi đi khác body gốc; If-None-Match
+    dùng so sánh weak nên client vẫn nhận 304 như trước.
+    """
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    etag, weak = response.get_etag()
+    key = f"{encoding}:{etag if etag and not weak else hashlib.sha1(body).hexdigest()}"
+    compressed = encoded_cache.get(key)
+    cached = compressed is not None
+    if not cached:
+        compressed = compress_body(body, encoding)
+        encoded_cache.set(key, compressed, ENCODED_CACHE_TTL, len(compressed))
+    metrics.inc('fpl_compressed_responses_total', (('encoding', encoding), ('cached', str(cached).lower())))
+    metrics.inc('fpl_response_bytes_saved_total', (), len(body) - len(compressed))
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
 
 @app.after_request
-def add_no_cache_headers(response):
-    """Thêm headers để ngăn trình duyệt cache các phản hồi API."""
-    if request.path.startswith('/api/'):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+def add_cache_headers(response):
+    """Gắn ETag cho phản hồi GET của API để trình duyệt revalidate (304) thay vì tải lại.
+
+    Trình duyệt vẫn phải hỏi lại server mỗi lần (no-cache), nhưng nếu dữ liệu không đổi
+    thì chỉ nhận về headers. Các request khác (POST, DELETE, stream) không được cache.
+    """
+    if not request.path.startswith('/api/'):
+        return response
+    if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed:
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
     return response
 
 @app.route('/')
@@ -270,13 +2604,13 @@ def add_manager():
             if manager_id not in session['managers']:
                 session['managers'].append(manager_id)
             
-            manager_info = tracker.managers_data[manager_id]['info']
+            manager_info = tracker.managers_data.get(manager_id).info
             return jsonify({
                 'success': True,
                 'manager': {
                     'id': manager_id,
-                    'name': f"{manager_info['player_first_name']} {manager_info['player_last_name']}",
-                    'team_name': manager_info['name']
+                    'name': manager_info.full_name,
+                    'team_name': manager_info.name
                 }
             })
         else:
@@ -296,7 +2630,7 @@ def get_manager_stats(manager_id):
                 return jsonify({'success': False, 'error': f'Manager ID {manager_id} không hợp lệ hoặc không tồn tại.'})
 
         # Update data trước khi lấy stats
-        tracker.update_manager_data(manager_id)
+        tracker.update_manager_data(manager_id, force_refresh=wants_refresh())
         
         stats = tracker.get_manager_stats(manager_id)
         if stats:
@@ -311,6 +2645,24 @@ def get_manager_stats(manager_id):
         logger.exception(f"Lỗi không xác định khi lấy stats cho manager {manager_id}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/managers/stats')
+def get_managers_stats():
+    """API lấy thống kê nhiều managers trong một request (?ids=1,2,3)."""
+    try:
+        manager_ids = parse_manager_ids(request.args.get('ids', ''))
+        if not manager_ids:
+            return jsonify({'success': False, 'error': 'Chưa truyền danh sách manager ID'})
+        if len(manager_ids) > MAX_BATCH_MANAGERS:
+            return jsonify({'success': False, 'error': f'Tối đa {MAX_BATCH_MANAGERS} managers mỗi request'})
+
+        stats, errors = tracker.get_managers_stats(manager_ids, force_refresh=wants_refresh())
+        return jsonify({'success': True, 'data': stats, 'errors': stats_error_messages(errors)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Manager ID phải là số'})
+    except Exception as e:
+        logger.exception("Lỗi không xác định khi lấy stats hàng loạt")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/compare-managers', methods=['POST'])
 def compare_managers():
     """API so sánh managers (có bổ sung live scores cho vòng hiện tại nếu chưa kết thúc)."""
@@ -321,72 +2673,29 @@ def compare_managers():
         if not manager_ids:
             return jsonify({'success': False, 'error': 'Chưa chọn managers để so sánh'})
 
-        # Update dữ liệu lịch sử cho các manager
-        for manager_id in manager_ids:
-            try:
-                tracker.update_manager_data(manager_id)
-            except (ManagerNotFound, FPLAPIError):
-                logger.warning(f"Skipping manager {manager_id} in comparison due to update failure.")
-
-        # Lấy dữ liệu so sánh cơ bản
-        comparison = tracker.compare_managers(manager_ids)
+        force_refresh = wants_refresh() or bool(data.get('force_refresh'))
+        deadline = time.monotonic() + REQUEST_DEADLINE
 
-        # Lấy thông tin gameweek hiện tại
-        bootstrap_data = tracker.api.get_bootstrap_static()
-        current_gw_info = next((gw for gw in bootstrap_data['events'] if gw['is_current']), None)
-
-        current_gameweek = None
-        current_gw_finished = True
+        # Update dữ liệu lịch sử cho các manager chưa có hoặc đã cũ (song song)
+        stale_ids = [
+            manager_id for manager_id in manager_ids
+            if force_refresh or not tracker.is_fresh(manager_id)
+        ]
+        _, errors = fan_out(
+            lambda manager_id: tracker.update_manager_data(manager_id, force_refresh=force_refresh),
+            stale_ids, deadline
+        )
+        for manager_id in errors:
+            logger.warning(f"Skipping manager {manager_id} in comparison due to update failure.")
 
-        if current_gw_info:
-            current_gameweek = current_gw_info['id']
-            current_gw_finished = current_gw_info['finished']
+        # Lấy dữ liệu so sánh cơ bản (layout='columns' cho dạng cột gọn hơn)
+        layout = request.args.get('layout') or data.get('layout') or 'rows'
+        if layout not in ('rows', 'columns'):
+            return jsonify({'success': False, 'error': 'layout phải là rows hoặc columns'})
+        comparison = tracker.compare_managers(manager_ids, layout=layout)
 
-            if not current_gw_finished:
-                # --- Lấy dữ liệu live toàn bộ cầu thủ ---
-                try:
-                    live_data = tracker.api.get_live_event(current_gameweek)
-                    elements_points = {
-                        el['id']: el['stats']['total_points']
-                        for el in live_data['elements']
-                    }
-                except Exception as e:
-                    logger.error(f"Không thể lấy dữ liệu live event GW{current_gameweek}: {e}")
-                    elements_points = {}
-
-                # --- Tính điểm live cho từng manager ---
-                for manager in comparison['managers']:
-                    try:
-                        picks = tracker.api.get_gameweek_picks(manager['id'], current_gameweek)
-                        starting = [p for p in picks['picks'] if p['position'] <= 11]
-
-                        live_points = 0
-                        for p in starting:
-                            player_id = p['element']
-                            multiplier = p['multiplier']
-                            live_points += elements_points.get(player_id, 0) * multiplier
-
-                        # Cập nhật vào danh sách gameweeks
-                        found_gw = False
-                        for g in manager['gameweeks']:
-                            if g['gameweek'] == current_gameweek:
-                                g['points'] = live_points
-                                g['total_points'] = manager['total_points'] + live_points
-                                found_gw = True
-                                break
-                        if not found_gw:
-                            manager['gameweeks'].append({
-                                'gameweek': current_gameweek,
-                                'points': live_points,
-                                'total_points': manager['total_points'] + live_points
-                            })
-
-                        # Thêm field live_total_points
-                        manager['live_total_points'] = manager['total_points'] + live_points
-
-                    except Exception as e:
-                        logger.warning(f"Không thể tính live points cho manager {manager['id']}: {e}")
-                        manager['live_total_points'] = manager['total_points']
+        # Lấy điểm live từ snapshot mới nhất của live poller
+        current_gameweek, current_gw_finished = merge_live_points(comparison, force_refresh)
 
         return jsonify({
             'success': True,
@@ -403,8 +2712,7 @@ def compare_managers():
 def remove_manager(manager_id):
     """API xóa manager"""
     try:
-        if manager_id in tracker.managers_data:
-            del tracker.managers_data[manager_id]
+        tracker.managers_data.pop(manager_id)
         
         # Xóa khỏi session
         if 'managers' in session and manager_id in session['managers']:
@@ -425,15 +2733,15 @@ def get_managers():
         
         for manager_id in session_managers:
             if manager_id not in tracker.managers_data:
-                # Nếu manager có trong session nhưng không có trong bộ nhớ của worker này, hãy thử thêm vào.
+                # Nếu manager có trong session nhưng không có trong bộ nhớ của worker này, nạp lại từ store (hoặc FPL API).
                 tracker.add_manager(manager_id)
-            if manager_id in tracker.managers_data:
-                manager_info = tracker.managers_data[manager_id]['info']
+            record = tracker.managers_data.get(manager_id)
+            if record is not None:
                 managers.append({
                     'id': manager_id,
-                    'name': f"{manager_info['player_first_name']} {manager_info['player_last_name']}",
-                    'team_name': manager_info['name'],
-                    'last_updated': tracker.managers_data[manager_id]['last_updated'].isoformat() if tracker.managers_data[manager_id]['last_updated'] else None
+                    'name': record.info.full_name,
+                    'team_name': record.info.name,
+                    'last_updated': record.last_updated.isoformat() if record.last_updated else None
                 })
         
         return jsonify({'success': True, 'data': managers})
@@ -445,7 +2753,7 @@ def get_managers():
 def get_league_standings(league_id):
     """API lấy bảng xếp hạng league"""
     try:
-        standings = tracker.api.get_league_standings(league_id)
+        standings = tracker.api.get_league_standings(league_id, force_refresh=wants_refresh())
         return jsonify({'success': True, 'data': standings})
     except ManagerNotFound as e: # Giả sử API có thể ném lỗi này cho league
         return jsonify({'success': False, 'error': f'Không tìm thấy league {league_id}.'})
@@ -454,57 +2762,121 @@ def get_league_standings(league_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/league/<int:league_id>/entries')
+def stream_league_entries(league_id):
+    """API stream toàn bộ entries của league.
+
+    format=ndjson (mặc định): dòng đầu là thông tin league, mỗi dòng tiếp theo là một entry.
+    format=json: một object JSON được gửi dần theo từng chunk.
+    Nếu lỗi giữa chừng, dòng/trường cuối cùng là {"error": ...}.
+    """
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in ('ndjson', 'json'):
+        return jsonify({'success': False, 'error': 'format phải là ndjson hoặc json'})
+    try:
+        first_page = tracker.api.get_league_standings(league_id)
+        league = first_page.get('league', {})
+    except FPLAPIError:
+        return jsonify({'success': False, 'error': f'Lỗi API khi tải dữ liệu league {league_id}.'})
+
+    def generate_ndjson():
+        yield app.json.dumps({'league': league}) + '\n'
+        try:
+            for entry in tracker.api.iter_league_entries(league_id, first_page=first_page):
+                yield app.json.dumps(entry) + '\n'
+        except FPLAPIError as e:
+            yield app.json.dumps({'error': str(e)}) + '\n'
+
+    def generate_json():
+        yield '{"success": true, "league": ' + app.json.dumps(league) + ', "entries": ['
+        separator = ''
+        error = None
+        try:
+            for entry in tracker.api.iter_league_entries(league_id, first_page=first_page):
+                yield separator + app.json.dumps(entry)
+                separator = ','
+        except FPLAPIError as e:
+            error = str(e)
+        yield '], "error": ' + app.json.dumps(error) + '}'
+
+    if output_format == 'json':
+        return Response(generate_json(), mimetype='application/json')
+    return Response(generate_ndjson(), mimetype='application/x-ndjson')
+
+@app.route('/api/export/<dataset>')
+def export_dataset(dataset):
+    """API export history, picks hoặc standings dạng CSV, Parquet hoặc Arrow (?format=csv|parquet|arrow).
+
+    Phạm vi: ?league=<id> (toàn bộ league, crawl dần theo trang), ?ids=1,2,3 hoặc managers trong
+    session; picks dùng ?gameweek=N (mặc định gameweek đang tính điểm). Dữ liệu được tải và ghi
+    theo từng batch EXPORT_BATCH_SIZE managers nên không giữ toàn bộ trong bộ nhớ. Nếu export
+    không đầy đủ (lỗi crawl league hoặc managers vẫn lỗi sau khi thử lại), stream kết thúc bằng
+    dòng EXPORT_ERROR_TRAILER ("#error: ..."); file Parquet/Arrow khi đó không có footer.
+    """
+    try:
+        columns = EXPORT_DATASETS.get(dataset)
+        if columns is None:
+            return jsonify({'success': False, 'error': f"dataset phải là một trong {', '.join(EXPORT_DATASETS)}"})
+        output_format = request.args.get('format', 'csv')
+        if output_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': f"format phải là một trong {', '.join(EXPORT_FORMATS)}"})
+        if output_format != 'csv' and pa is None:
+            return jsonify({'success': False, 'error': 'Export Parquet/Arrow cần cài pyarrow'})
+
+        league_id = int(request.args['league']) if request.args.get('league') else None
+        ids_param = request.args.get('ids', '')
+        if league_id is not None:
+            manager_ids = (entry['entry'] for entry in export_api.iter_league_entries(league_id))
+            scope = f'league-{league_id}'
+        else:
+            manager_ids = parse_manager_ids(ids_param) if ids_param else session.get('managers', [])
+            scope = 'managers'
+
+        gameweek = int(request.args['gameweek']) if request.args.get('gameweek') else None
+        if dataset == 'picks' and gameweek is None:
+            scores_gameweek = tracker.api.get_bootstrap().scores_gameweek
+            if not scores_gameweek:
+                return jsonify({'success': False, 'error': 'Không tìm thấy gameweek nào.'})
+            gameweek = scores_gameweek['id']
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Tham số league, ids hoặc gameweek không hợp lệ'})
+    except FPLAPIError as e:
+        return jsonify({'success': False, 'error': f'Lỗi API: {e}'})
+
+    def generate():
+        batches = export_batches(dataset, manager_ids, league_id, gameweek)
+        try:
+            if output_format == 'csv':
+                yield from encode_csv(columns, batches)
+            else:
+                yield from encode_arrow(columns, batches, output_format)
+        except FPLAPIError as e:
+            logger.error(f"Export {dataset} ({scope}) không đầy đủ: {e}")
+            yield EXPORT_ERROR_TRAILER.format(e)
+
+    mimetype, extension = EXPORT_FORMATS[output_format]
+    suffix = f'-gw{gameweek}' if dataset == 'picks' else ''
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{dataset}-{scope}{suffix}.{extension}"',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/live-scores')
 def get_live_scores():
     """API lấy điểm live của các managers cho gameweek hiện tại."""
     try:
-        # 1. Lấy gameweek hiện tại
-        bootstrap_data = tracker.api.get_bootstrap_static()
-        current_gw_info = next((gw for gw in bootstrap_data['events'] if gw['is_current']), None)
-        
-        if not current_gw_info:
-            # Nếu không có gw current, thử lấy gw finished cuối cùng
-            finished_gws = [gw for gw in bootstrap_data['events'] if gw['finished']]
-            if finished_gws:
-                current_gw_info = max(finished_gws, key=lambda x: x['id'])
-            else:
-                 return jsonify({'success': False, 'error': 'Không tìm thấy gameweek nào.'})
+        manager_ids = session.get('managers', [])
 
-        current_gameweek = current_gw_info['id']
+        # Đọc snapshot mới nhất do live poller dựng sẵn
+        snapshot = live_poller.get_snapshot(manager_ids, force_refresh=wants_refresh())
+        current_gameweek = snapshot.scores_gameweek
+        if current_gameweek is None:
+            return jsonify({'success': False, 'error': 'Không tìm thấy gameweek nào.'})
 
-        # 2. Lấy danh sách managers
-        manager_ids = session.get('managers', [])
         if not manager_ids:
             return jsonify({'success': True, 'data': {'gameweek': current_gameweek, 'scores': []}})
 
-        live_scores = []
-        # 3. Lấy điểm live cho từng manager
-        for manager_id in manager_ids:
-            try:
-                if manager_id not in tracker.managers_data:
-                    tracker.add_manager(manager_id)
-
-                picks_data = tracker.api.get_gameweek_picks(manager_id, current_gameweek)
-                manager_info = tracker.managers_data.get(manager_id, {}).get('info', {})
-                
-                entry_history = picks_data.get('entry_history', {})
-                live_scores.append({
-                    'id': manager_id,
-                    'name': f"{manager_info.get('player_first_name', '')} {manager_info.get('player_last_name', '')}".strip(),
-                    'team_name': manager_info.get('name', 'N/A'),
-                    'live_points': entry_history.get('points', 0),
-                    'transfers_cost': entry_history.get('event_transfers_cost', 0)
-                })
-            except FPLAPIError as e:
-                logger.warning(f"Could not fetch live score for manager {manager_id}: {e}")
-                manager_info = tracker.managers_data.get(manager_id, {}).get('info', {})
-                live_scores.append({
-                    'id': manager_id,
-                    'name': f"{manager_info.get('player_first_name', '')} {manager_info.get('player_last_name', '')}".strip() or f"Manager {manager_id}",
-                    'team_name': manager_info.get('name', 'N/A'),
-                    'live_points': 'Error',
-                    'transfers_cost': 'N/A'
-                })
+        live_scores = build_live_scores(snapshot, manager_ids)
 
         return jsonify({
             'success': True,
@@ -520,12 +2892,157 @@ def get_live_scores():
         logger.exception("Lỗi không xác định khi lấy live scores")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/live-archive')
+def get_live_archive_index():
+    """API liệt kê các gameweek có live archive cùng khoảng thời gian đã lưu."""
+    if live_archive is None:
+        return jsonify({'success': False, 'error': 'Live archive đang tắt (LIVE_ARCHIVE_ENABLED).'})
+    gameweeks = []
+    for gameweek in live_archive.gameweeks():
+        records = live_archive.records(gameweek)
+        if records:
+            gameweeks.append({
+                'gameweek': gameweek,
+                'snapshots': len(records),
+                'first': datetime.fromtimestamp(records[0], timezone.utc),
+                'last': datetime.fromtimestamp(records[-1], timezone.utc)
+            })
+    return jsonify({'success': True, 'data': gameweeks})
+
+@app.route('/api/live-archive/<int:gameweek>')
+def get_live_archive_scores(gameweek):
+    """API điểm live của các managers tại một thời điểm trong gameweek, đọc từ live archive.
+
+    ?at=<ISO datetime> hoặc ?minute=<số phút kể từ bản ghi đầu tiên>, mặc định là bản ghi cuối;
+    managers lấy từ ?ids=1,2 hoặc theo session. Đội hình đọc từ store nên thường không cần gọi upstream.
+    """
+    try:
+        if live_archive is None:
+            return jsonify({'success': False, 'error': 'Live archive đang tắt (LIVE_ARCHIVE_ENABLED).'})
+        records = live_archive.records(gameweek)
+        if not records:
+            return jsonify({'success': False, 'error': f'Không có live archive cho GW{gameweek}.'})
+
+        ids_param = request.args.get('ids', '')
+        manager_ids = parse_manager_ids(ids_param) if ids_param else session.get('managers', [])
+        if len(manager_ids) > MAX_BATCH_MANAGERS:
+            return jsonify({'success': False, 'error': f'Tối đa {MAX_BATCH_MANAGERS} managers mỗi request'})
+
+        at = None
+        if request.args.get('at'):
+            try:
+                at = datetime.fromisoformat(request.args['at'].replace('Z', '+00:00'))
+            except ValueError:
+                # Định dạng HTTP-date như trường timestamp trong response
+                at = parsedate_to_datetime(request.args['at'])
+            if at.tzinfo is None:
+                at = at.replace(tzinfo=timezone.utc)
+            at = at.timestamp()
+        elif request.args.get('minute'):
+            at = records[0] + float(request.args['minute']) * 60
+        found = live_archive.snapshot_at(gameweek, at)
+        if found is None:
+            return jsonify({'success': False, 'error': 'Chưa có bản ghi nào tại thời điểm này.'})
+        timestamp, points = found
+
+        all_picks, errors = tracker.get_gameweek_picks_many(manager_ids, gameweek)
+        engine = LiveScoringEngine(capacity=max(1, len(all_picks)))
+        engine.set_element_points(points)
+        for manager_id, picks in all_picks.items():
+            engine.set_picks(manager_id, picks)
+        totals = engine.totals()
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'gameweek': gameweek,
+                'timestamp': datetime.fromtimestamp(timestamp, timezone.utc),
+                'minute': round((timestamp - records[0]) / 60, 1),
+                'scores': {manager_id: totals[manager_id] for manager_id in manager_ids if manager_id in totals},
+                'errors': stats_error_messages(errors)
+            }
+        })
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Tham số ids, at hoặc minute không hợp lệ'})
+    except FPLAPIError as e:
+        return jsonify({'success': False, 'error': f'Lỗi API: {e}'})
+    except Exception as e:
+        logger.exception(f"Lỗi không xác định khi đọc live archive GW{gameweek}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/live-stream')
+def live_stream():
+    """Server-Sent Events: đẩy điểm live đã thay đổi của các managers (?ids=1,2 hoặc theo session).
+
+    Mỗi event có id là version của snapshot; khi kết nối lại với Last-Event-ID trùng
+    version hiện tại thì không gửi lại dữ liệu cũ.
+    """
+    try:
+        ids_param = request.args.get('ids', '')
+        manager_ids = parse_manager_ids(ids_param) if ids_param else session.get('managers', [])
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Manager ID phải là số'})
+    if len(manager_ids) > MAX_BATCH_MANAGERS:
+        return jsonify({'success': False, 'error': f'Tối đa {MAX_BATCH_MANAGERS} managers mỗi request'})
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    client_version = int(last_event_id) if last_event_id.isdigit() else None
+    if not live_stream_slots.acquire(blocking=False):
+        response = jsonify({'success': False, 'error': 'Quá nhiều live stream, hãy dùng /api/live-scores'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(LIVE_STREAM_MAX_SECONDS)
+        return response
+
+    def generate():
+        version = client_version
+        sent = {}
+        # Snapshot hiện tại có thể chưa có, hoặc chưa chứa các managers của client
+        try:
+            snapshot = live_poller.get_snapshot(manager_ids)
+            current_version = live_poller.version
+        except Exception as e:
+            logger.error(f"Live stream could not build snapshot: {e}")
+            snapshot, current_version = None, version
+
+        if snapshot is not None and current_version == version:
+            # Client kết nối lại và đã có dữ liệu của version này
+            sent = {score['id']: score for score in build_live_scores(snapshot, manager_ids)}
+
+        yield f"retry: {int(LIVE_STREAM_HEARTBEAT * 1000)}\n\n"
+        started = time.monotonic()
+        while True:
+            if snapshot is not None and current_version != version:
+                scores = build_live_scores(snapshot, manager_ids)
+                changed = [score for score in scores if sent.get(score['id']) != score]
+                sent.update((score['id'], score) for score in changed)
+                version = current_version
+                if changed:
+                    payload = app.json.dumps({'gameweek': snapshot.scores_gameweek, 'scores': changed})
+                    yield f"id: {version}\nevent: scores\ndata: {payload}\n\n"
+
+            if time.monotonic() - started > LIVE_STREAM_MAX_SECONDS:
+                return
+            new_version, new_snapshot = live_poller.wait_for_update(current_version, LIVE_STREAM_HEARTBEAT)
+            # Stream còn mở nghĩa là managers vẫn đang được xem
+            live_poller.watch(manager_ids)
+            if new_version == current_version:
+                yield ": heartbeat\n\n"
+            current_version, snapshot = new_version, new_snapshot
+
+    response = Response(generate(), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+    # Server WSGI luôn gọi close() khi kết thúc response (kể cả khi client ngắt trước byte đầu tiên)
+    response.call_on_close(live_stream_slots.release)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics của worker theo định dạng Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/test-connection')
 def test_connection():
     """Test kết nối API"""
     try:
-        bootstrap_data = tracker.api.get_bootstrap_static()
-        current_gw = next((gw for gw in bootstrap_data['events'] if gw['is_current']), None)
+        current_gw = tracker.api.get_bootstrap().current
         return jsonify({
             'success': True, 
             'message': 'Kết nối API thành công',
@@ -536,5 +3053,24 @@ def test_connection():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Số liệu hit/miss của response cache FPL API."""
+    return jsonify({'success': True, 'data': tracker.api.cache.stats()})
+
+@app.route('/api/upstream-status')
+def upstream_status():
+    """Trạng thái circuit breaker, số lần retry và số request được gộp khi gọi FPL API."""
+    return jsonify({'success': True, 'data': {
+        **tracker.api.gateway.stats(),
+        'coalesced_requests': tracker.api.flights.coalesced
+    }})
+
+@app.route('/api/cache-stats', methods=['DELETE'])
+def clear_cache():
+    """Xóa toàn bộ response cache để buộc lần gọi tiếp theo lấy dữ liệu mới."""
+    tracker.api.cache.invalidate()
+    return jsonify({'success': True, 'message': 'Đã xóa cache'})
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""Benchmark các route chính của app.py trên server FPL giả lập (fake_fpl_server.py).
+
+Với mỗi số lượng manager (mặc định 14, 500, 10000), script nạp managers vào tracker rồi đo
+throughput và độ trễ p50/p90/p99 của:
+    compare_managers   POST /api/compare-managers (so sánh toàn bộ managers)
+    live_scores        GET  /api/live-scores (mỗi client là một dashboard, session có SESSION_MANAGERS managers)
+    manager_stats      GET  /api/manager/<id>/stats (id ngẫu nhiên)
+
+Kết quả ghi ra JSON (--output) để so sánh giữa các phiên bản; --baseline in chênh lệch so
+với một lần chạy trước và trả về exit code 1 nếu có scenario chậm hơn ngưỡng --threshold.
+
+Cách dùng:
+    python benchmark.py --sizes 14,500 --latency 0.02 --output bench.json
+    python benchmark.py --baseline bench.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import fake_fpl_server
+
+SCENARIOS = ('compare_managers', 'live_scores', 'manager_stats')
+
+# Số managers trong session của một client ở scenario live_scores: cookie session phải có cỡ
+# như của một trình duyệt thật (giới hạn ~4 KB), các client khác nhau xem các nhóm managers khác nhau
+SESSION_MANAGERS = 50
+
+# Các chỉ số dùng để so sánh với baseline: (tên, True nếu giá trị lớn hơn là tốt hơn)
+COMPARED_METRICS = (('throughput_rps', True), ('p50_ms', False), ('p99_ms', False))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Benchmark:
+    def __init__(self, app_module, fake: fake_fpl_server.FakeFPL, args):
+        self.app = app_module
+        self.fake = fake
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.manager_ids: List[int] = []
+        self.sessions = itertools.count()
+
+    def seed_managers(self, size: int) -> Dict:
+        """Nạp thêm managers cho đủ size (thông tin + history), đo thời gian nạp lạnh."""
+        new_ids = list(range(len(self.manager_ids) + 1, size + 1))
+        before = self.fake.stats()['requests']
+        start = time.perf_counter()
+        tracker = self.app.tracker
+        added, _ = self.app.fan_out(tracker.add_manager, new_ids)
+        ok_ids = [manager_id for manager_id in new_ids if added.get(manager_id)]
+        _, errors = self.app.fan_out(tracker.update_manager_data, ok_ids)
+        seconds = time.perf_counter() - start
+        self.manager_ids.extend(ok_ids)
+        return {
+            'scenario': 'seed',
+            'managers': size,
+            'seconds': round(seconds, 4),
+            'added': len(ok_ids),
+            'errors': len(new_ids) - len(ok_ids) + len(errors),
+            'upstream_requests': self.upstream_delta(before),
+        }
+
+    def upstream_delta(self, before: Dict) -> Dict:
+        after = self.fake.stats()['requests']
+        return {endpoint: count - before.get(endpoint, 0)
+                for endpoint, count in after.items() if count != before.get(endpoint, 0)}
+
+    def make_request(self, scenario: str):
+        """Trả về hàm gửi một request của scenario bằng test client riêng của thread."""
+        client = self.app.app.test_client()
+        manager_ids = list(self.manager_ids)
+        if scenario == 'compare_managers':
+            body = {'manager_ids': manager_ids}
+            return lambda: client.post('/api/compare-managers', json=body)
+        if scenario == 'live_scores':
+            start = next(self.sessions) * SESSION_MANAGERS
+            with client.session_transaction() as flask_session:
+                flask_session['managers'] = [manager_ids[(start + i) % len(manager_ids)]
+                                             for i in range(min(SESSION_MANAGERS, len(manager_ids)))]
+            return lambda: client.get('/api/live-scores')
+        rng = random.Random(self.random.random())
+        return lambda: client.get(f'/api/manager/{rng.choice(manager_ids)}/stats')
+
+    def run_scenario(self, scenario: str, size: int) -> Dict:
+        """Chạy scenario với --concurrency thread cho tới khi đủ --requests hoặc hết --max-seconds."""
+        for _ in range(self.args.warmup):
+            self.make_request(scenario)()
+
+        latencies, errors = [], [0]
+        remaining = [self.args.requests]
+        lock = threading.Lock()
+        before = self.fake.stats()['requests']
+        start = time.perf_counter()
+        stop_at = start + self.args.max_seconds
+
+        def worker():
+            send = self.make_request(scenario)
+            while True:
+                with lock:
+                    if remaining[0] <= 0 or time.perf_counter() > stop_at:
+                        return
+                    remaining[0] -= 1
+                t0 = time.perf_counter()
+                response = send()
+                elapsed = time.perf_counter() - t0
+                payload = response.get_json(silent=True) or {}
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code >= 400 or not payload.get('success'):
+                        errors[0] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(self.args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        latencies.sort()
+        ms = [value * 1000 for value in latencies]
+        return {
+            'scenario': scenario,
+            'managers': size,
+            'requests': len(latencies),
+            'errors': errors[0],
+            'seconds': round(seconds, 4),
+            'throughput_rps': round(len(latencies) / seconds, 2) if seconds else 0.0,
+            'p50_ms': round(percentile(ms, 50), 3),
+            'p90_ms': round(percentile(ms, 90), 3),
+            'p99_ms': round(percentile(ms, 99), 3),
+            'mean_ms': round(sum(ms) / len(ms), 3) if ms else 0.0,
+            'max_ms': round(ms[-1], 3) if ms else 0.0,
+            'upstream_requests': self.upstream_delta(before),
+        }
+
+    def run(self) -> List[Dict]:
+        results = []
+        for size in sorted(self.args.sizes):
+            seed = self.seed_managers(size)
+            print_result(seed)
+            results.append(seed)
+            for scenario in self.args.scenarios:
+                result = self.run_scenario(scenario, size)
+                print_result(result)
+                results.append(result)
+        return results
+
+
+def print_result(result: Dict):
+    if result['scenario'] == 'seed':
+        line = (f"{'seed':<17} n={result['managers']:<6} {result['seconds']:>9.2f}s "
+                f"added={result['added']} errors={result['errors']}")
+    else:
+        line = (f"{result['scenario']:<17} n={result['managers']:<6} {result['throughput_rps']:>9.2f} req/s "
+                f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+                f"requests={result['requests']} errors={result['errors']}")
+    print(line, file=sys.stderr)
+
+
+def compare_with_baseline(results: List[Dict], baseline: Dict, threshold: float) -> bool:
+    """In chênh lệch so với baseline, trả về True nếu có chỉ số tệ hơn ngưỡng threshold (%)."""
+    previous = {(r['scenario'], r['managers']): r for r in baseline.get('results', [])}
+    regressed = False
+    print(f"so sánh với baseline {baseline.get('meta', {}).get('git_commit', '?')}:", file=sys.stderr)
+    for result in results:
+        old = previous.get((result['scenario'], result['managers']))
+        if result['scenario'] == 'seed' or not old:
+            continue
+        deltas = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            if not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = ' !'
+                regressed = True
+            deltas.append(f'{metric} {change:+.1f}%{flag}')
+        print(f"  {result['scenario']:<17} n={result['managers']:<6} " + ', '.join(deltas), file=sys.stderr)
+    return regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark các route của app.py trên FPL API giả lập')
+    parser.add_argument('--sizes', default='14,500,10000',
+                        type=lambda value: [int(size) for size in value.split(',') if size])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(',') if name])
+    parser.add_argument('--requests', type=int, default=200, help='số request đo cho mỗi scenario')
+    parser.add_argument('--max-seconds', type=float, default=30, help='thời gian tối đa mỗi scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ của FPL API giả lập (giây)')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--fixtures', default=fake_fpl_server.FIXTURES_DIR)
+    parser.add_argument('--keep-rate-limits', action='store_true',
+                        help='giữ rate limit phía client (mặc định tắt để đo chính app)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file JSON kết quả (mặc định in ra stdout)')
+    parser.add_argument('--baseline', help='file JSON của lần chạy trước để so sánh')
+    parser.add_argument('--threshold', type=float, default=20, help='ngưỡng regression (%%)')
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scenario không hợp lệ: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake = fake_fpl_server.FakeFPL(fake_fpl_server.load_fixtures(args.fixtures), args.latency, args.jitter,
+                                   args.error_rate, args.error_status, seed=args.seed)
+    server = fake_fpl_server.start_server(fake)
+
+    # app.py đọc cấu hình lúc import nên phải đặt biến môi trường trước
+    workdir = tempfile.mkdtemp(prefix='fpl-bench-')
+    os.environ['FPL_API_BASE_URL'] = fake_fpl_server.base_url(server)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    os.environ['LIVE_POLLER_ENABLED'] = 'false'
+    os.environ['LIVE_ARCHIVE_DIR'] = os.path.join(workdir, 'live_archive')
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    if not args.keep_rate_limits:
+        app_module.tracker.api.gateway.buckets = {}
+
+    results = Benchmark(app_module, fake, args).run()
+    server.shutdown()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_with_baseline(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Tải dữ liệu export (history, picks, standings) từ /api/export/<dataset> của app.py ra file.
+
+Response được ghi thẳng ra file theo từng chunk nên export cả league lớn không tốn bộ nhớ.
+Nếu server báo export không đầy đủ (dòng cuối "#error: ..."), script in lỗi và trả về exit code 1.
+
+Cách dùng:
+    python export.py history --league 314 --format parquet
+    python export.py picks --ids 1,2,3 --gameweek 10 --output picks.csv
+    python export.py standings --league 314 --base-url https://fifa2526.onrender.com --output -
+"""
+import argparse
+import re
+import sys
+import time
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+# Dòng cuối server ghi thêm khi export không đầy đủ (EXPORT_ERROR_TRAILER trong app.py)
+ERROR_MARKER = b'\n#error: '
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Export dữ liệu FPL từ app.py ra CSV/Parquet/Arrow')
+    parser.add_argument('dataset', choices=('history', 'picks', 'standings'))
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument('--league', type=int, help='export toàn bộ managers của league')
+    scope.add_argument('--ids', help='danh sách manager ID, phân cách bằng dấu phẩy')
+    parser.add_argument('--format', default='csv', choices=('csv', 'parquet', 'arrow'))
+    parser.add_argument('--gameweek', type=int, help='gameweek của picks (mặc định gameweek hiện tại)')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--output', help="file kết quả ('-' là stdout, mặc định theo tên server gợi ý)")
+    parser.add_argument('--timeout', type=float, default=300, help='thời gian chờ tối đa giữa hai chunk (giây)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {'format': args.format}
+    if args.league is not None:
+        params['league'] = args.league
+    else:
+        params['ids'] = args.ids
+    if args.gameweek is not None:
+        params['gameweek'] = args.gameweek
+
+    url = f"{args.base_url.rstrip('/')}/api/export/{args.dataset}"
+    start = time.perf_counter()
+    with requests.get(url, params=params, stream=True, timeout=(10, args.timeout)) as response:
+        response.raise_for_status()
+        # Lỗi tham số được trả về dạng JSON thay vì file
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            print(response.json().get('error', response.text), file=sys.stderr)
+            return 1
+
+        output = args.output
+        if output is None:
+            match = re.search(r'filename="([^"]+)"', response.headers.get('Content-Disposition', ''))
+            output = match.group(1) if match else f'{args.dataset}.{args.format}'
+
+        size = 0
+        tail = b''
+        f = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+                tail = (tail + chunk)[-CHUNK_SIZE:]
+        finally:
+            if f is not sys.stdout.buffer:
+                f.close()
+
+    seconds = time.perf_counter() - start
+    position = tail.rfind(ERROR_MARKER)
+    if position != -1:
+        message = tail[position + len(ERROR_MARKER):].decode('utf-8', 'replace').strip()
+        print(f"{output}: export không đầy đủ ({size} bytes trong {seconds:.2f}s): {message}", file=sys.stderr)
+        return 1
+    print(f"{output}: {size} bytes trong {seconds:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
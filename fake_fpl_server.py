@@ -0,0 +1,356 @@
+"""Server giả lập FPL API dùng cho benchmark (benchmark.py).
+
+Phục vụ bootstrap-static, entry, history, picks, event live và leagues-classic standings.
+Mỗi loại dữ liệu lấy từ fixture đã ghi lại trong bench_fixtures/ (tạo bằng lệnh `record`),
+thiếu fixture nào thì dùng dữ liệu tổng hợp cùng cấu trúc. Dữ liệu của từng manager được
+sinh từ fixture mẫu (đổi id, điểm, đội hình theo seed là manager id) nên server phục vụ được
+bất kỳ số manager nào mà kết quả vẫn ổn định giữa các lần chạy.
+
+Cách dùng:
+    python fake_fpl_server.py record --manager 123456 --league 314
+    python fake_fpl_server.py serve --port 8765 --latency 0.05 --error-rate 0.01
+    FPL_API_BASE_URL=http://127.0.0.1:8765/api/ python app.py
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures')
+FPL_API_URL = 'https://fantasy.premierleague.com/api/'
+
+# Gameweek hiện tại (đang diễn ra) của dữ liệu tổng hợp
+CURRENT_GAMEWEEK = 10
+NUM_ELEMENTS = 700
+LEAGUE_PAGE_SIZE = 50
+
+ROUTES = [
+    ('bootstrap', re.compile(r'^/api/bootstrap-static/$')),
+    ('entry', re.compile(r'^/api/entry/(\d+)/$')),
+    ('history', re.compile(r'^/api/entry/(\d+)/history/$')),
+    ('picks', re.compile(r'^/api/entry/(\d+)/event/(\d+)/picks/$')),
+    ('live', re.compile(r'^/api/event/(\d+)/live/$')),
+    ('league', re.compile(r'^/api/leagues-classic/(\d+)/standings/$')),
+]
+
+
+def synthetic_fixtures() -> Dict[str, Dict]:
+    """Fixture mẫu cùng cấu trúc với response thật của FPL API."""
+    events = [{
+        'id': gw,
+        'name': f'Gameweek {gw}',
+        'deadline_time': f'2025-{8 + (gw - 1) // 4 % 5:02d}-{1 + (gw - 1) % 4 * 7:02d}T10:00:00Z',
+        'finished': gw < CURRENT_GAMEWEEK,
+        'data_checked': gw < CURRENT_GAMEWEEK,
+        'is_previous': gw == CURRENT_GAMEWEEK - 1,
+        'is_current': gw == CURRENT_GAMEWEEK,
+        'is_next': gw == CURRENT_GAMEWEEK + 1,
+    } for gw in range(1, 39)]
+    elements = [{
+        'id': element_id,
+        'web_name': f'Player {element_id}',
+        'team': element_id % 20 + 1,
+        'element_type': element_id % 4 + 1,
+        'now_cost': 45 + element_id % 90,
+        'total_points': element_id % 120,
+    } for element_id in range(1, NUM_ELEMENTS + 1)]
+    return {
+        'bootstrap': {
+            'events': events,
+            'elements': elements,
+            'teams': [{'id': t, 'name': f'Team {t}', 'short_name': f'T{t:02d}'} for t in range(1, 21)],
+            'element_types': [
+                {'id': 1, 'singular_name_short': 'GKP'}, {'id': 2, 'singular_name_short': 'DEF'},
+                {'id': 3, 'singular_name_short': 'MID'}, {'id': 4, 'singular_name_short': 'FWD'},
+            ],
+        },
+        'entry': {
+            'id': 1,
+            'player_first_name': 'Bench',
+            'player_last_name': 'Manager',
+            'name': 'Bench XI',
+            'player_region_name': 'England',
+            'summary_overall_points': 0,
+            'summary_overall_rank': 1,
+            'current_event': CURRENT_GAMEWEEK,
+        },
+        'history': {
+            'current': [{
+                'event': gw, 'points': 50, 'total_points': 50 * gw, 'rank': 1, 'rank_sort': 1,
+                'overall_rank': 1, 'percentile_rank': 1, 'bank': 5, 'value': 1000, 'event_transfers': 1, 'event_transfers_cost': 0,
+                'points_on_bench': 5,
+            } for gw in range(1, CURRENT_GAMEWEEK + 1)],
+            'past': [],
+            'chips': [],
+        },
+        'picks': {
+            'active_chip': None,
+            'entry_history': {'event': CURRENT_GAMEWEEK, 'points': 0, 'total_points': 0,
+                              'event_transfers_cost': 0, 'points_on_bench': 0},
+            'picks': [{
+                'element': i + 1, 'position': i + 1, 'multiplier': (2 if i == 0 else 1) if i < 11 else 0,
+                'is_captain': i == 0, 'is_vice_captain': i == 1,
+            } for i in range(15)],
+        },
+        'live': {
+            'elements': [{'id': element_id, 'stats': {'minutes': 90, 'total_points': 2}, 'explain': []}
+                         for element_id in range(1, NUM_ELEMENTS + 1)],
+        },
+        'league': {
+            'league': {'id': 1, 'name': 'Bench League'},
+            'standings': {'has_next': False, 'page': 1, 'results': [{
+                'id': 1, 'entry': 1, 'entry_name': 'Bench XI', 'player_name': 'Bench Manager',
+                'rank': 1, 'last_rank': 1, 'rank_sort': 1, 'total': 0, 'event_total': 0,
+            }]},
+        },
+    }
+
+
+def load_fixtures(fixtures_dir: str = FIXTURES_DIR) -> Dict[str, Dict]:
+    """Đọc fixture đã ghi lại, thiếu loại nào thì dùng fixture tổng hợp."""
+    fixtures = synthetic_fixtures()
+    for name in fixtures:
+        path = os.path.join(fixtures_dir, f'{name}.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                fixtures[name] = json.load(f)
+    return fixtures
+
+
+def record_fixtures(manager_id: int, league_id: int, fixtures_dir: str = FIXTURES_DIR,
+                    base_url: str = FPL_API_URL):
+    """Ghi lại response thật của FPL API làm fixture mẫu."""
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+    def fetch(path):
+        response = session.get(base_url + path, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    bootstrap = fetch('bootstrap-static/')
+    current = next((gw for gw in bootstrap['events'] if gw['is_current']), None) or bootstrap['events'][0]
+    fixtures = {
+        'bootstrap': bootstrap,
+        'entry': fetch(f'entry/{manager_id}/'),
+        'history': fetch(f'entry/{manager_id}/history/'),
+        'picks': fetch(f"entry/{manager_id}/event/{current['id']}/picks/"),
+        'live': fetch(f"event/{current['id']}/live/"),
+        'league': fetch(f'leagues-classic/{league_id}/standings/'),
+    }
+    os.makedirs(fixtures_dir, exist_ok=True)
+    for name, data in fixtures.items():
+        with open(os.path.join(fixtures_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        print(f'recorded {name}.json')
+
+
+class FakeFPL:
+    """Sinh response cho từng path, kèm độ trễ và lỗi giả lập.
+
+    error_rate là xác suất một request bị trả về error_status (429 kèm Retry-After).
+    Response có ETag nên client revalidate bằng If-None-Match sẽ nhận 304.
+    """
+
+    def __init__(self, fixtures: Optional[Dict[str, Dict]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 league_size: int = 10000, seed: int = 0):
+        self.fixtures = fixtures or load_fixtures()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.league_size = league_size
+        self.seed = seed
+        self.element_ids = [el['id'] for el in self.fixtures['bootstrap']['elements']]
+        self.requests = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.render = lru_cache(maxsize=65536)(self._render)
+
+    def _rng(self, *key) -> random.Random:
+        # Seed dạng chuỗi để kết quả không phụ thuộc PYTHONHASHSEED
+        return random.Random(':'.join(map(str, (self.seed, *key))))
+
+    def entry(self, manager_id: int) -> Dict:
+        data = copy.deepcopy(self.fixtures['entry'])
+        data['id'] = manager_id
+        data['name'] = f'Bench XI {manager_id}'
+        data['player_last_name'] = f'Manager {manager_id}'
+        return data
+
+    def history(self, manager_id: int) -> Dict:
+        rng = self._rng('history', manager_id)
+        data = copy.deepcopy(self.fixtures['history'])
+        total = 0
+        for row in data['current']:
+            row['points'] = rng.randint(20, 100)
+            row['event_transfers_cost'] = rng.choice((0, 0, 0, 4))
+            total += row['points'] - row['event_transfers_cost']
+            row['total_points'] = total
+            row['overall_rank'] = rng.randint(1, 10_000_000)
+        return data
+
+    def picks(self, manager_id: int, gameweek: int) -> Dict:
+        rng = self._rng('picks', manager_id, gameweek)
+        data = copy.deepcopy(self.fixtures['picks'])
+        elements = rng.sample(self.element_ids, len(data['picks']))
+        for pick, element_id in zip(data['picks'], elements):
+            pick['element'] = element_id
+        data['entry_history']['event'] = gameweek
+        data['entry_history']['points'] = rng.randint(20, 100)
+        return data
+
+    def live(self, gameweek: int) -> Dict:
+        rng = self._rng('live', gameweek)
+        data = copy.deepcopy(self.fixtures['live'])
+        for element in data['elements']:
+            element['stats']['total_points'] = rng.choice((0, 1, 2, 2, 2, 3, 5, 6, 8, 12))
+        return data
+
+    def league(self, league_id: int, page: int) -> Dict:
+        data = copy.deepcopy(self.fixtures['league'])
+        row = data['standings']['results'][0]
+        start = (page - 1) * LEAGUE_PAGE_SIZE
+        results = []
+        for i in range(start, min(self.league_size, start + LEAGUE_PAGE_SIZE)):
+            result = dict(row, id=i + 1, entry=i + 1, entry_name=f'Bench XI {i + 1}',
+                          rank=i + 1, last_rank=i + 1, rank_sort=i + 1, total=5000 - i % 5000)
+            results.append(result)
+        data['league']['id'] = league_id
+        data['standings'].update(page=page, results=results,
+                                 has_next=start + LEAGUE_PAGE_SIZE < self.league_size)
+        return data
+
+    def _render(self, path: str, query: str) -> Optional[bytes]:
+        for name, pattern in ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+            args = [int(value) for value in match.groups()]
+            if name == 'bootstrap':
+                data = self.fixtures['bootstrap']
+            elif name == 'league':
+                page = int(parse_qs(query).get('page_standings', ['1'])[0])
+                data = self.league(args[0], page)
+            else:
+                data = getattr(self, name)(*args)
+            return json.dumps(data, separators=(',', ':')).encode()
+        return None
+
+    def endpoint(self, path: str) -> str:
+        return next((name for name, pattern in ROUTES if pattern.match(path)), 'unknown')
+
+    def handle(self, path: str, query: str = '', if_none_match: Optional[str] = None) -> tuple:
+        """Trả về (status, headers, body) cho một request GET."""
+        endpoint = self.endpoint(path)
+        with self._lock:
+            self.requests[endpoint] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.error_rate and self._random.random() < self.error_rate
+            if failed:
+                self.errors[endpoint] += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            headers = {'Retry-After': '1'} if self.error_status == 429 else {}
+            return self.error_status, headers, b''
+
+        body = self.render(path, query)
+        if body is None:
+            return 404, {}, b''
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if if_none_match == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag, 'Content-Type': 'application/json'}, body
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'requests': dict(self.requests), 'errors': dict(self.errors)}
+
+
+class FakeFPLHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake: FakeFPL = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/__stats__':
+            status, headers, body = 200, {'Content-Type': 'application/json'}, json.dumps(self.fake.stats()).encode()
+        else:
+            status, headers, body = self.fake.handle(parts.path, parts.query, self.headers.get('If-None-Match'))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(fake: FakeFPL, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Chạy server trên thread nền, port=0 để hệ điều hành chọn port trống."""
+    handler = type('Handler', (FakeFPLHandler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-fpl-server', daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}/api/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Server giả lập FPL API cho benchmark')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help='chạy server giả lập')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--fixtures', default=FIXTURES_DIR)
+    serve.add_argument('--latency', type=float, default=0.0, help='độ trễ cố định mỗi request (giây)')
+    serve.add_argument('--jitter', type=float, default=0.0, help='độ trễ ngẫu nhiên thêm tối đa (giây)')
+    serve.add_argument('--error-rate', type=float, default=0.0, help='xác suất trả về lỗi (0-1)')
+    serve.add_argument('--error-status', type=int, default=503)
+    serve.add_argument('--league-size', type=int, default=10000)
+
+    record = sub.add_parser('record', help='ghi lại response thật của FPL API làm fixture')
+    record.add_argument('--manager', type=int, required=True)
+    record.add_argument('--league', type=int, required=True)
+    record.add_argument('--fixtures', default=FIXTURES_DIR)
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record_fixtures(args.manager, args.league, args.fixtures)
+        return
+
+    fake = FakeFPL(load_fixtures(args.fixtures), args.latency, args.jitter, args.error_rate,
+                   args.error_status, args.league_size)
+    server = start_server(fake, args.host, args.port)
+    print(f'Fake FPL API: {base_url(server)}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,25 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-import requests
 import json
 
-# FPL API Endpoints
-FPL_API_URL_BOOTSTRAP = "https://fantasy.premierleague.com/api/bootstrap-static/"
-FPL_API_URL_ENTRY = "https://fantasy.premierleague.com/api/entry/{}/"
-FPL_API_URL_HISTORY = "https://fantasy.premierleague.com/api/entry/{}/history/"
+# Dùng chung FantasyAPI (Session có connection pool, timeout, cache, retry) và fan_out với app.py
+# để backend Django không mở kết nối mới tới FPL cho mỗi lần gọi
+from app import FPLAPIError, ManagerNotFound, fan_out, tracker
+
+fpl_api = tracker.api
+
+def fetch_managers(manager_ids):
+    """Tải entry và history của các managers song song, trả về {manager_id: (entry, history)}.
+
+    Ném ra lỗi đầu tiên (ManagerNotFound, FPLAPIError hoặc TimeoutError) nếu có manager lỗi.
+    """
+    fetchers = {'entry': fpl_api.get_manager_info, 'history': fpl_api.get_manager_history}
+    keys = [(kind, manager_id) for manager_id in manager_ids for kind in fetchers]
+    results, errors = fan_out(lambda key: fetchers[key[0]](key[1]), keys)
+    if errors:
+        raise next(iter(errors.values()))
+    return {manager_id: (results[('entry', manager_id)], results[('history', manager_id)]) for manager_id in manager_ids}
 
 def dashboard_view(request):
     # View này chỉ đơn giản là render template chính của bạn.
@@ -17,15 +29,12 @@ def dashboard_view(request):
 
 def test_connection(request):
     try:
-        response = requests.get(FPL_API_URL_BOOTSTRAP)
-        response.raise_for_status() # Raise an exception for bad status codes
-        data = response.json()
-        current_gameweek = next((gw for gw in data['events'] if gw['is_current']), None)
+        current_gameweek = fpl_api.get_bootstrap().current
         return JsonResponse({
             "success": True,
             "current_gameweek": current_gameweek['id'] if current_gameweek else 'N/A'
         })
-    except requests.exceptions.RequestException as e:
+    except FPLAPIError as e:
         return JsonResponse({"success": False, "error": str(e)}, status=502)
 
 @csrf_exempt
@@ -37,9 +46,7 @@ def add_manager(request):
             if not manager_id:
                 return JsonResponse({"success": False, "error": "Manager ID is required."}, status=400)
 
-            response = requests.get(FPL_API_URL_ENTRY.format(manager_id))
-            response.raise_for_status()
-            data = response.json()
+            data = fpl_api.get_manager_info(int(manager_id))
 
             manager_data = {
                 "id": data['id'],
@@ -47,9 +54,9 @@ def add_manager(request):
                 "team_name": data['name'],
             }
             return JsonResponse({"success": True, "manager": manager_data})
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                return JsonResponse({"success": False, "error": f"Manager ID {manager_id} không tồn tại."}, status=404)
+        except ManagerNotFound:
+            return JsonResponse({"success": False, "error": f"Manager ID {manager_id} không tồn tại."}, status=404)
+        except FPLAPIError as e:
             return JsonResponse({"success": False, "error": f"Lỗi FPL API: {e}"}, status=502)
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -58,13 +65,7 @@ def add_manager(request):
 
 def get_manager_stats(request, manager_id):
     try:
-        entry_res = requests.get(FPL_API_URL_ENTRY.format(manager_id))
-        entry_res.raise_for_status()
-        entry_data = entry_res.json()
-
-        history_res = requests.get(FPL_API_URL_HISTORY.format(manager_id))
-        history_res.raise_for_status()
-        history_data = history_res.json()
+        entry_data, history_data = fetch_managers([manager_id])[manager_id]
 
         gameweek_points, total_points, highest_gw, lowest_gw = [], 0, None, None
 
@@ -96,11 +97,11 @@ def get_manager_stats(request, manager_id):
 def compare_managers(request):
     if request.method == 'POST':
         try:
-            manager_ids = json.loads(request.body).get('manager_ids', [])
+            manager_ids = [int(manager_id) for manager_id in json.loads(request.body).get('manager_ids', [])]
+            managers = fetch_managers(manager_ids)
             all_managers_data = []
             for manager_id in manager_ids:
-                entry_res = requests.get(FPL_API_URL_ENTRY.format(manager_id)); entry_res.raise_for_status(); entry_data = entry_res.json()
-                history_res = requests.get(FPL_API_URL_HISTORY.format(manager_id)); history_res.raise_for_status(); history_data = history_res.json()
+                entry_data, history_data = managers[manager_id]
                 all_managers_data.append({
                     "id": entry_data['id'], "name": f"{entry_data['player_first_name']} {entry_data['player_last_name']}",
                     "team_name": entry_data['name'], "total_points": entry_data['summary_overall_points'],